@@ -0,0 +1,9 @@
+"""Benchmarks for chronotask. The scripts run on their own,
+
+    python benchmarks/startup.py
+
+the hot path suite and the store generator are modules of this package:
+
+    python -m benchmarks.hot_paths --tasks 10000 --output results.json
+    python -m benchmarks.synthetic --tasks 10000 --days 730 DATA_DIR
+"""
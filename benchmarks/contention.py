@@ -0,0 +1,95 @@
+"""Multi-process write contention benchmark for the JSON store.
+
+Starts --workers processes that add tasks, mark every other one done and
+log a minute of work on one shared task, all against the same data.json.
+Half of the workers open the store once, like a running timer, the other
+half reopen it for every operation, like separate CLI calls. A small
+--compact-size forces snapshot rewrites during the run. Reports the write
+throughput and exits with status 1 when any update is missing afterwards.
+
+    python -m benchmarks.contention --workers 8 --ops 200
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import chronotask_nsx116.store as store_module
+from chronotask_nsx116.interchange import new_task
+from chronotask_nsx116.store import JsonStore
+from chronotask_nsx116.models import Session
+
+
+def open_store(data_dir):
+    return JsonStore(os.path.join(data_dir, "data.json"), os.path.join(data_dir, "archive"))
+
+
+def worker(worker_id, data_dir, ops, reopen, shared_id):
+    store = None
+    writes = 0
+    for i in range(ops):
+        if store is None or reopen:
+            store = open_store(data_dir)
+        now = int(time.time())
+        task = new_task(text=f"worker {worker_id} task {i}")
+        store.add_task(task)
+        writes += 1
+        if i % 2:
+            store.update_task(task["global_id"], {
+                "status": "done", "date_done": datetime.now().strftime("%Y-%m-%d %H:%M:%S")})
+            writes += 1
+        store.add_work(shared_id, 60, now)
+        writes += 1
+    return writes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=8, help="Writer processes")
+    parser.add_argument("--ops", type=int, default=200, help="Tasks added per worker")
+    parser.add_argument("--compact-size", type=int, default=64 * 1024,
+                        help="Journal bytes after which a snapshot is written")
+    args = parser.parse_args()
+    store_module.JOURNAL_COMPACT_SIZE = args.compact_size  # Inherited by the forked workers
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        store = open_store(data_dir)
+        shared = new_task(text="shared task")
+        store.add_task(shared)
+        store.start_session(shared["global_id"], Session(int(time.time())))
+
+        jobs = [(worker_id, data_dir, args.ops, worker_id % 2 == 1, shared["global_id"])
+                for worker_id in range(args.workers)]
+        started = time.perf_counter()
+        with multiprocessing.Pool(args.workers) as pool:
+            writes = sum(pool.starmap(worker, jobs))
+        elapsed = time.perf_counter() - started
+
+        store = open_store(data_dir)
+        tasks = list(store.iter_tasks())
+        done = sum(1 for task in tasks if task["status"] == "done")
+        shared_work = store.get_task(shared["global_id"])["work_seconds"]
+        expected = {
+            "tasks": 1 + args.workers * args.ops,
+            "done": args.workers * (args.ops // 2),
+            "shared seconds": args.workers * args.ops * 60,
+        }
+        found = {"tasks": len(tasks), "done": done, "shared seconds": shared_work}
+
+    print(f"{args.workers} workers, {writes} writes in {elapsed:.2f} s "
+          f"({writes / elapsed:.0f} writes/s)")
+    failed = False
+    for name, count in expected.items():
+        print(f"{name:<16} {found[name]:>8} of {count}")
+        if found[name] != count:
+            failed = True
+    if failed:
+        print("Updates were lost.")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
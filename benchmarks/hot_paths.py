@@ -0,0 +1,199 @@
+"""Times the hot paths of chronotask against a synthetic store.
+
+Generates a store with benchmarks.synthetic and times loading and saving
+data.json, TaskManager startup, listing for every status filter and with
+field filters (cold as a one-shot command, warm from the daemon's query
+indexes), printing the task table, the status and delete paths,
+logging work on a task, building and querying the search index and the
+monthly plot. Every mutation runs on a fresh copy of the store. The results are written as
+JSON so runs on different commits can be compared.
+
+    python -m benchmarks.hot_paths --tasks 10000 --days 730 --output results.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.synthetic import STATUS_MIX, make_data, parse_status_mix, write_store
+from chronotask_nsx116.aggregate import grouped_stats
+from chronotask_nsx116.query import TaskQuery
+from chronotask_nsx116.settings import Files
+from chronotask_nsx116.task_manager import TaskManager
+from chronotask_nsx116.writing_to_task import load_data, lock_data, save_data, write_total_activity_to_task
+
+LIST_FILTERS = {"active": None, "done": ["done"], "dismissed": ["dismissed"], "all": ["all"]}
+
+
+def measure(run, setup=None, runs=5):
+    """Median and fastest time of run(setup()) in milliseconds, setup is
+    not timed. Whatever run prints is discarded."""
+    times = []
+    for _ in range(runs):
+        state = setup() if setup else None
+        with contextlib.redirect_stdout(io.StringIO()):
+            started = time.perf_counter()
+            run(state)
+            times.append((time.perf_counter() - started) * 1000)
+    return {"runs": runs, "median_ms": round(statistics.median(times), 3),
+            "min_ms": round(min(times), 3)}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Bench:
+    """A pristine data directory and the TaskManagers opened on copies of it."""
+
+    def __init__(self, root, data):
+        # appdirs puts the data directory under XDG_DATA_HOME
+        os.environ["XDG_DATA_HOME"] = root
+        self.data_dir = Files().data_dir
+        self.pristine_dir = os.path.join(root, "pristine")
+        self.data_file = write_store(self.pristine_dir, data)
+
+    def fresh_manager(self):
+        """A TaskManager on a new copy of the generated store, listed once
+        so that 'id N' style IDs exist."""
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+        shutil.copytree(self.pristine_dir, self.data_dir)
+        with contextlib.redirect_stdout(io.StringIO()):
+            manager = TaskManager()
+            manager.list_tasks(["all"])
+        return manager
+
+
+def run_suite(args):
+    data = make_data(args.tasks, args.days, args.sessions_per_day, args.status_mix, args.seed)
+    results = {}
+    with tempfile.TemporaryDirectory() as root:
+        bench = Bench(root, data)
+        runs = args.runs
+
+        results["load_data"] = measure(lambda _: load_data(bench.data_file), runs=runs)
+        loaded = load_data(bench.data_file)[0]
+
+        def save(_):
+            with lock_data(bench.data_file):
+                save_data(bench.data_file, loaded)
+        results["save_data"] = measure(save, runs=runs)
+
+        bench.fresh_manager()
+        results["TaskManager.__init__"] = measure(lambda _: TaskManager(), runs=runs)
+
+        for name, status in LIST_FILTERS.items():
+            results[f"list_tasks[{name}]"] = measure(lambda manager, status=status: manager.list_tasks(status),
+                                                     bench.fresh_manager, runs)
+        month_ago = (datetime.now() - timedelta(days=30)).strftime("%Y-%m-%d")
+        queries = {
+            "project": TaskQuery(project="work"),
+            "tag": TaskQuery(tag="review"),
+            "due in the last 30 days": TaskQuery(due_after=month_ago),
+            "project, min value": TaskQuery(project="home", min_value=3),
+        }
+        def daemon_manager(query):
+            # The daemon's store builds the query indexes on its first
+            # query, later commands find them ready
+            manager = bench.fresh_manager()
+            manager.store.long_lived = True
+            list(manager.store.query_tasks(None, query))
+            return manager
+        for name, query in queries.items():
+            # Cold: a one-shot command, which scans the tasks
+            results[f"list_tasks[all, {name}, cold]"] = measure(
+                lambda manager, query=query: manager.list_tasks(["all"], query=query), bench.fresh_manager, runs)
+            results[f"list_tasks[all, {name}, warm]"] = measure(
+                lambda manager, query=query: manager.list_tasks(["all"], query=query),
+                lambda query=query: daemon_manager(query), runs)
+        results["print_tasks"] = measure(lambda manager: manager.print_tasks(), bench.fresh_manager, runs)
+
+        def first_task(manager):
+            return manager, manager.select_tasks([1])
+        for name in ("mark_tasks_done", "mark_tasks_active", "dismiss_tasks", "delete_tasks"):
+            results[name] = measure(lambda state, name=name: getattr(state[0], name)(state[1]),
+                                    lambda: first_task(bench.fresh_manager()), runs)
+
+        def task_with_sessions(manager):
+            task = next(task for task in manager.store.iter_tasks() if task["sessions"])
+            return manager, task["global_id"]
+        results["write_total_activity_to_task"] = measure(
+            lambda state: write_total_activity_to_task(state[0].store, state[1], 90),
+            lambda: task_with_sessions(bench.fresh_manager()), runs)
+
+        def indexed_manager():
+            manager = bench.fresh_manager()
+            manager.search_index.load(manager.store)
+            return manager
+        results["SearchIndex.build"] = measure(
+            lambda manager: manager.search_index.build(manager.store), bench.fresh_manager, runs)
+        results["search_tasks[loaded index]"] = measure(
+            lambda manager: manager.search_tasks("task 4"), indexed_manager, runs)
+
+        today = datetime.now()
+        first_date = (today - timedelta(days=365)).strftime("%Y-%m-%d")
+        last_date = today.strftime("%Y-%m-%d")
+        results["grouped_stats[project, 1 year]"] = measure(
+            lambda manager: grouped_stats(manager.store, first_date, last_date, "project"),
+            bench.fresh_manager, runs)
+
+        import plotext
+        from chronotask_nsx116.stats import make_minutes_by_date_plot
+
+        def plot(manager):
+            make_minutes_by_date_plot(today.year, today.month, manager.store)
+
+        def plot_setup():
+            plotext.clear_figure()  # plotext keeps adding to one figure
+            return bench.fresh_manager()
+        results["make_minutes_by_date_plot"] = measure(plot, plot_setup, runs)
+
+        store_bytes = os.path.getsize(bench.data_file)
+
+    return {
+        "commit": git_commit(),
+        "python": sys.version.split()[0],
+        "params": {"tasks": args.tasks, "days": args.days, "sessions_per_day": args.sessions_per_day,
+                   "status_mix": args.status_mix, "seed": args.seed, "runs": args.runs},
+        "store_bytes": store_bytes,
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tasks", type=int, default=10000, help="Number of tasks")
+    parser.add_argument("--days", type=int, default=365, help="Days of history")
+    parser.add_argument("--sessions-per-day", type=int, default=8, help="Work sessions per day")
+    parser.add_argument("--status-mix", type=parse_status_mix, default=STATUS_MIX,
+                        help="Status weights, e.g. active=0.3,done=0.6,dismissed=0.1")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    parser.add_argument("--runs", type=int, default=5, help="Runs per measurement")
+    parser.add_argument("--output", "-o", help="File to write the JSON results to, standard output by default")
+    args = parser.parse_args()
+
+    report = run_suite(args)
+    contents = json.dumps(report, indent=4)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(contents + "\n")
+        for name, result in report["results"].items():
+            print(f"{name:<34} {result['median_ms']:>10.2f} ms")
+    else:
+        print(contents)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Load/save throughput of the data.json codecs.
+
+Builds synthetic stores of 1k, 10k and 100k tasks with a few sessions each
+and times save_data and load_data with every codec, once with the json
+module and once with orjson when it is installed. Reports the file size,
+the median time of each operation and the throughput in MB/s.
+
+    python -m benchmarks.load_save --sizes 1000 10000 100000 --runs 3
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+import chronotask_nsx116.serializers as serializers
+from chronotask_nsx116.serializers import CODECS
+from chronotask_nsx116.writing_to_task import load_data, save_data
+
+from benchmarks.synthetic import make_data
+
+DAYS = 3 * 365  # History the sessions are spread over
+
+
+def measure(data_file, data, codec, runs):
+    save_times, load_times = [], []
+    for _ in range(runs):
+        started = time.perf_counter()
+        save_data(data_file, data, codec)
+        save_times.append(time.perf_counter() - started)
+        started = time.perf_counter()
+        load_data(data_file)
+        load_times.append(time.perf_counter() - started)
+    return os.path.getsize(data_file), statistics.median(save_times), statistics.median(load_times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000],
+                        help="Task counts of the synthetic stores")
+    parser.add_argument("--sessions", type=int, default=5, help="Average sessions per task")
+    parser.add_argument("--runs", type=int, default=3, help="Runs per measurement")
+    args = parser.parse_args()
+
+    installed_orjson = serializers.orjson
+    libraries = [("json", None)] + ([("orjson", installed_orjson)] if installed_orjson else [])
+    print(f"{'tasks':>7} {'codec':<8} {'library':<7} {'size':>9} {'save':>9} {'load':>9} "
+          f"{'save MB/s':>9} {'load MB/s':>9}")
+    with tempfile.TemporaryDirectory() as data_dir:
+        data_file = os.path.join(data_dir, "data.json")
+        for size in args.sizes:
+            data = make_data(size, DAYS, max(1, size * args.sessions // DAYS))
+            for codec in CODECS.values():
+                for library, module in libraries:
+                    serializers.orjson = module
+                    file_size, save_time, load_time = measure(data_file, data, codec, args.runs)
+                    megabytes = file_size / 1e6
+                    print(f"{size:>7} {codec.name:<8} {library:<7} {megabytes:>7.1f}MB "
+                          f"{save_time * 1000:>7.0f}ms {load_time * 1000:>7.0f}ms "
+                          f"{megabytes / save_time:>9.1f} {megabytes / load_time:>9.1f}")
+    serializers.orjson = installed_orjson
+
+
+if __name__ == "__main__":
+    main()
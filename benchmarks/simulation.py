@@ -0,0 +1,96 @@
+"""Runs days of pomodoro sessions on a simulated clock and checks the work
+they wrote.
+
+Every day one session of a single task replays a workday of scripted
+activity (an event every --every seconds for --hours hours with a lunch
+break) through FocusTrack and IntervalTimer, without pynput or pygame.
+Afterwards the task's work_seconds, the sum of its session seconds, the
+daily rollup and what the timer counted must all agree. Prints the wall
+time and the figures, and exits with status 1 on any mismatch.
+
+    python -m benchmarks.simulation --days 30 --work 25 --short-rest 5
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from chronotask_nsx116.interchange import new_task
+from chronotask_nsx116.models import task_sessions
+from chronotask_nsx116.settings import Settings
+from chronotask_nsx116.simulation import simulate_days, workday_timeline
+from chronotask_nsx116.store import JsonStore
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--days", type=int, default=30, help="Days with one session each")
+    parser.add_argument("--hours", type=int, default=8, help="Hours of activity per day")
+    parser.add_argument("--every", type=int, default=30, help="Seconds between activity events")
+    parser.add_argument("--work", type=int, default=25, help="Work duration in minutes")
+    parser.add_argument("--short-rest", type=int, default=5, help="Short rest duration in minutes")
+    parser.add_argument("--long-rest", type=int, default=15, help="Long rest duration in minutes")
+    parser.add_argument("--pomodoros", type=int, default=4, help="Pomodoros before a long rest")
+    parser.add_argument("--inactivity", type=int, default=90, help="Inactivity limit in seconds")
+    parser.add_argument("--output", help="Also write the results as JSON to this file")
+    args = parser.parse_args()
+
+    settings = Settings(work_duration=args.work * 60, short_rest_duration=args.short_rest * 60,
+                        long_rest_duration=args.long_rest * 60,
+                        pomodoros_before_long_rest=args.pomodoros,
+                        inactivity_limit=args.inactivity, notifications="none")
+    timeline = workday_timeline(args.hours, args.every)
+    # Sessions start at 9:00 local time, days ago enough to end before today
+    first_day = datetime.now().replace(hour=9, minute=0, second=0, microsecond=0)
+    epoch = first_day.timestamp() - args.days * 24 * 3600
+
+    with tempfile.TemporaryDirectory() as root:
+        store = JsonStore(os.path.join(root, "data.json"), os.path.join(root, "archive"))
+        task = new_task(text="Simulated task")
+        store.add_task(task)
+        started = time.perf_counter()
+        sessions = simulate_days(store, task["global_id"], args.days, timeline, settings, epoch)
+        wall_ms = (time.perf_counter() - started) * 1000
+
+        # Read back from disk, the way the next command would see it
+        store = JsonStore(os.path.join(root, "data.json"), os.path.join(root, "archive"))
+        task = store.get_task(task["global_id"])
+        written = [session.seconds for session in task_sessions(task)]
+        rollup_seconds = sum(store.data["rollup"]["days"].values())
+
+    expected = [session["expected_seconds"] for session in sessions]
+    results = {
+        "days": args.days,
+        "simulated_hours": round(args.days * (max(timeline) + args.inactivity) / 3600, 1),
+        "wall_ms": round(wall_ms, 3),
+        "pomodoros": sum(session["pomodoros"] for session in sessions),
+        "notifications": sum(session["notifications"] for session in sessions),
+        "activity_events": sum(session["activity_events"] for session in sessions),
+        "work_seconds": task["work_seconds"],
+        "session_seconds": sum(written),
+        "rollup_seconds": rollup_seconds,
+        "expected_seconds": sum(expected),
+        "rest_seconds": round(sum(session["rest_seconds"] for session in sessions)),
+        "idle_seconds": round(sum(session["idle_seconds"] for session in sessions)),
+    }
+    print(json.dumps(results, indent=4))
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=4)
+
+    problems = []
+    if written != expected:
+        problems.append(f"session seconds {written} differ from what the timer counted {expected}")
+    if not task["work_seconds"] == sum(written) == rollup_seconds:
+        problems.append(f"work_seconds {task['work_seconds']}, session seconds {sum(written)} "
+                        f"and rollup {rollup_seconds} differ")
+    for problem in problems:
+        print(problem, file=sys.stderr)
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
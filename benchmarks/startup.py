@@ -0,0 +1,83 @@
+"""Cold-start benchmark for the chronotask CLI.
+
+Runs `add` and `list` in fresh interpreters against a scratch data
+directory and reports the median wall time of each command next to a bare
+interpreter start. Exits with status 1 when a command imports the timer or
+plotting stack, or takes longer than --max-ms above the bare start.
+
+    python benchmarks/startup.py --runs 20 --max-ms 150
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# Modules that plain task commands must not load
+HEAVY_MODULES = ["pygame", "pynput", "plotext", "chronotask_nsx116.focustrack",
+                 "chronotask_nsx116.interval_timer", "chronotask_nsx116.stats"]
+
+RUNNER = (
+    "import sys, json\n"
+    "sys.argv = ['chronotask'] + sys.argv[1:]\n"
+    "from chronotask_nsx116.chronotask import main\n"
+    "main()\n"
+    f"heavy = [name for name in {HEAVY_MODULES!r} if name in sys.modules]\n"
+    "print(json.dumps(heavy), file=sys.stderr)\n"
+)
+
+
+def run_once(argv, env):
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", RUNNER] + argv, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                            text=True, check=True)
+    elapsed = (time.perf_counter() - started) * 1000
+    return elapsed, json.loads(result.stderr.strip().splitlines()[-1])
+
+
+def bare_start(runs, env):
+    times = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "pass"], env=env, check=True)
+        times.append((time.perf_counter() - started) * 1000)
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10, help="Runs per command")
+    parser.add_argument("--max-ms", type=float, default=None,
+                        help="Fail when a command's median exceeds the bare start by more")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as data_home:
+        env = dict(os.environ, XDG_DATA_HOME=data_home)
+        baseline = bare_start(args.runs, env)
+        print(f"{'python -c pass':<32} {baseline:8.1f} ms")
+        failed = False
+        for argv in (["add", "benchmark task"], ["list"], ["list", "--status", "all"]):
+            times = []
+            heavy = set()
+            for _ in range(args.runs):
+                elapsed, loaded = run_once(argv, env)
+                times.append(elapsed)
+                heavy.update(loaded)
+            median = statistics.median(times)
+            print(f"{'chronotask ' + ' '.join(argv):<32} {median:8.1f} ms "
+                  f"(+{median - baseline:.1f} ms)")
+            if heavy:
+                print(f"    imports heavy modules: {', '.join(sorted(heavy))}")
+                failed = True
+            if args.max_ms is not None and median - baseline > args.max_ms:
+                print(f"    slower than the {args.max_ms} ms budget")
+                failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Synthetic data.json stores for benchmarks.
+
+Tasks are added evenly over --days of history, the newest today. Every
+day gets --sessions-per-day work sessions on tasks that existed that day,
+and tasks are closed after their last session according to --status-mix.
+
+    python -m benchmarks.synthetic --tasks 10000 --days 730 DATA_DIR
+"""
+import argparse
+import os
+import random
+import time
+import uuid
+
+from chronotask_nsx116.interchange import new_task
+from chronotask_nsx116.models import TIMESTAMP_FORMAT
+from chronotask_nsx116.writing_to_task import DATA_FORMAT, build_rollup, lock_data, save_data
+
+DAY = 24 * 3600
+STATUS_MIX = {"active": 0.3, "done": 0.6, "dismissed": 0.1}
+PROJECTS = [None, "work", "home", "study", "chronotask"]
+TAGS = [None, "urgent", "later", "urgent,review"]
+
+
+def parse_status_mix(value):
+    # "active=0.3,done=0.6,dismissed=0.1" -> {"active": 0.3, ...}
+    mix = {}
+    for part in value.split(","):
+        status, _, weight = part.partition("=")
+        if status not in STATUS_MIX:
+            raise argparse.ArgumentTypeError(f"unknown status '{status}'")
+        mix[status] = float(weight)
+    return mix
+
+
+def make_data(tasks=10000, days=365, sessions_per_day=8, status_mix=STATUS_MIX, seed=0):
+    """A data.json document in the current format, tasks oldest first.
+    The other benchmarks build their stores with it, and their single
+    tasks with new_task."""
+    rng = random.Random(seed)
+    now = int(time.time())
+    today = now // DAY * DAY
+    first_day = today - (days - 1) * DAY
+    statuses = list(status_mix)
+    weights = [status_mix[status] for status in statuses]
+    task_list = []
+    added_at = [min(first_day + i * days * DAY // tasks + rng.randrange(DAY), now) for i in range(tasks)]
+    for i, added in enumerate(added_at):
+        task_list.append(new_task(
+            text=f"Synthetic task {i} with a description of a typical length",
+            date=time.strftime("%Y-%m-%d", time.localtime(added + rng.randrange(14 * DAY))),
+            project=rng.choice(PROJECTS), tag=rng.choice(TAGS), value=rng.choice([None, 1, 2, 3]),
+            global_id=str(uuid.UUID(int=rng.getrandbits(128))),
+            date_added=time.strftime(TIMESTAMP_FORMAT, time.localtime(added)),
+        ))
+
+    # Sessions go to tasks added by the day they are on, oldest day first
+    # so every task's sessions stay in order
+    added_by_day = 0
+    for day in range(days):
+        day_start = first_day + day * DAY
+        while added_by_day < tasks and added_at[added_by_day] < day_start + DAY:
+            added_by_day += 1
+        if not added_by_day:
+            continue
+        for _ in range(sessions_per_day):
+            task = task_list[rng.randrange(added_by_day)]
+            started = day_start + rng.randrange(8 * 3600, 20 * 3600)
+            seconds = rng.randrange(5 * 60, 90 * 60)
+            if task["sessions"] and started < task["sessions"][-1][1]:
+                started = task["sessions"][-1][1] + 60
+            task["sessions"].append([started, started + seconds, seconds])
+            task["work_seconds"] += seconds
+
+    for task, added in zip(task_list, added_at):
+        status = rng.choices(statuses, weights)[0]
+        if status != "active":
+            last_work = task["sessions"][-1][1] if task["sessions"] else added
+            closed_at = time.strftime(TIMESTAMP_FORMAT, time.localtime(min(last_work + 3600, now)))
+            task["status"] = status
+            task["date_done" if status == "done" else "date_dismissed"] = closed_at
+
+    data = {"format": DATA_FORMAT, "store_id": uuid.UUID(int=rng.getrandbits(128)).hex,
+            "settings": {}, "sorted_ids": {}, "tasks": task_list}
+    data["rollup"] = build_rollup(task_list)
+    return data
+
+
+def write_store(data_dir, data):
+    """Writes data as the data.json of data_dir, returns its path."""
+    os.makedirs(data_dir, exist_ok=True)
+    data_file = os.path.join(data_dir, "data.json")
+    with lock_data(data_file):
+        save_data(data_file, data)
+    return data_file
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("data_dir", help="Directory to write data.json to")
+    parser.add_argument("--tasks", type=int, default=10000, help="Number of tasks")
+    parser.add_argument("--days", type=int, default=365, help="Days of history")
+    parser.add_argument("--sessions-per-day", type=int, default=8, help="Work sessions per day")
+    parser.add_argument("--status-mix", type=parse_status_mix, default=STATUS_MIX,
+                        help="Status weights, e.g. active=0.3,done=0.6,dismissed=0.1")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    args = parser.parse_args()
+    data = make_data(args.tasks, args.days, args.sessions_per_day, args.status_mix, args.seed)
+    data_file = write_store(args.data_dir, data)
+    print(f"Wrote {args.tasks} tasks to {data_file} ({os.path.getsize(data_file)} bytes)")
+
+
+if __name__ == "__main__":
+    main()
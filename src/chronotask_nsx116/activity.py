@@ -0,0 +1,158 @@
+import time
+from chronotask_nsx116.profiling import count
+
+# Activity kinds passed to the callback
+MOUSE = "mouse"
+KEYBOARD = "keyboard"
+IDLE_COUNTER = "idle counter"
+
+
+class ActivitySource:
+    """Tells FocusTrack when the user was last active.
+
+    on_activity(kind) is called on activity, at most once per min_interval
+    seconds; events in between are coalesced into the last activity time.
+    events_seen counts the raw events, events_processed the callbacks that
+    were actually made."""
+
+    def __init__(self, clock=time.monotonic, min_interval=1.0):
+        self.clock = clock
+        self.min_interval = min_interval
+        self.on_activity = None
+        self.last_activity = clock()
+        self.events_seen = 0
+        self.events_processed = 0
+
+    def start(self, scheduler, on_activity):
+        self.on_activity = on_activity
+
+    def stop(self):
+        pass
+
+    def last_activity_time(self):
+        return self.last_activity
+
+    def report(self, kind):
+        # Runs on every raw event, so it only counts and compares clocks
+        # until min_interval has passed since the last processed event
+        self.events_seen += 1
+        count("activity_events")
+        now = self.clock()
+        if now - self.last_activity < self.min_interval:
+            return
+        self.last_activity = now
+        self.events_processed += 1
+        count("activity_callbacks")
+        if self.on_activity:
+            self.on_activity(kind)
+
+
+class InputListenerSource(ActivitySource):
+    """Mouse moves and key presses reported by pynput listeners."""
+
+    def __init__(self, clock=time.monotonic, min_interval=1.0):
+        super().__init__(clock, min_interval)
+        self.listeners = []
+
+    def start(self, scheduler, on_activity):
+        super().start(scheduler, on_activity)
+        from pynput import mouse, keyboard  # Needs a display, so only loaded here
+        self.listeners = [
+            mouse.Listener(on_move=lambda x, y: self.report(MOUSE)),
+            keyboard.Listener(on_press=lambda key: self.report(KEYBOARD)),
+        ]
+        for listener in self.listeners:
+            listener.start()
+
+    def stop(self):
+        for listener in self.listeners:
+            listener.stop()
+        self.listeners = []
+
+
+class IdleCounterSource(ActivitySource):
+    """Polls the X server idle counter (MIT-SCREEN-SAVER extension) once per
+    poll_interval instead of receiving every input event. The last activity
+    time is read from the counter on demand, so inactivity checks need no
+    callbacks at all."""
+
+    def __init__(self, clock=time.monotonic, poll_interval=1.0):
+        super().__init__(clock, poll_interval)
+        self.poll_interval = poll_interval
+        self.scheduler = None
+        self.display = None
+        self.root = None
+
+    def start(self, scheduler, on_activity):
+        super().start(scheduler, on_activity)
+        from Xlib import display  # python-xlib comes with pynput on Linux
+        self.display = display.Display()
+        self.root = self.display.screen().root
+        self.scheduler = scheduler
+        self.poll()
+
+    def stop(self):
+        if self.scheduler:
+            self.scheduler.cancel("activity_poll")
+        if self.display:
+            self.display.close()
+            self.display = None
+
+    def idle_seconds(self):
+        return self.root.screensaver_query_info().idle / 1000
+
+    def last_activity_time(self):
+        if self.display:
+            self.read_counter()
+        return self.last_activity
+
+    def read_counter(self):
+        """Moves the last activity time forward if the idle counter was reset,
+        returns True if it was."""
+        last_activity = self.clock() - self.idle_seconds()
+        # The counter has millisecond resolution, smaller moves are jitter
+        if last_activity - self.last_activity < 0.01:
+            return False
+        self.events_seen += 1
+        self.last_activity = last_activity
+        return True
+
+    def poll(self):
+        if self.read_counter():
+            self.events_processed += 1
+            if self.on_activity:
+                self.on_activity(IDLE_COUNTER)
+        self.scheduler.schedule_in("activity_poll", self.poll_interval, self.poll)
+
+
+class ScriptedSource(ActivitySource):
+    """Fake source for tests and simulations: reports activity at the given
+    offsets in seconds after start, through the timer's scheduler."""
+
+    def __init__(self, timeline, clock=time.monotonic, min_interval=0):
+        super().__init__(clock, min_interval)
+        self.timeline = sorted(timeline)
+        self.scheduler = None
+
+    def start(self, scheduler, on_activity):
+        super().start(scheduler, on_activity)
+        self.scheduler = scheduler
+        started_at = self.clock()
+        for index, offset in enumerate(self.timeline):
+            scheduler.schedule(f"scripted_activity_{index}", started_at + offset,
+                               lambda: self.report("scripted"))
+
+    def stop(self):
+        if self.scheduler:
+            for index in range(len(self.timeline)):
+                self.scheduler.cancel(f"scripted_activity_{index}")
+
+
+ACTIVITY_SOURCES = {
+    "input": InputListenerSource,
+    "idle": IdleCounterSource,
+}
+
+
+def make_activity_source(name, clock=time.monotonic):
+    return ACTIVITY_SOURCES.get(name, InputListenerSource)(clock=clock)
@@ -0,0 +1,148 @@
+import calendar
+import time
+from array import array
+from chronotask_nsx116.profiling import span
+
+GROUP_BY = ["project", "tag", "task", "weekday", "hour"]
+NO_VALUE = "(none)"
+
+
+class SessionColumns:
+    """The sessions of a date range flattened into parallel arrays, one
+    item per session: its start and stop in epoch seconds, its work
+    seconds and the position of its task in tasks. Groups are summed over
+    these arrays by integer key instead of walking task histories."""
+
+    def __init__(self):
+        self.started = array("q")
+        self.stopped = array("q")
+        self.seconds = array("q")
+        self.task_positions = array("l")
+        self.tasks = []
+
+    @classmethod
+    def from_store(cls, store, first_date, last_date):
+        columns = cls()
+        positions = {}
+        for task, session in store.iter_sessions(first_date, last_date):
+            position = positions.get(task["global_id"])
+            if position is None:
+                position = positions[task["global_id"]] = len(columns.tasks)
+                columns.tasks.append(task)
+            columns.started.append(session.started)
+            # A session still running has no stop, it counts where it started
+            columns.stopped.append(max(session.stopped or session.started, session.started))
+            columns.seconds.append(session.seconds)
+            columns.task_positions.append(position)
+        return columns
+
+
+def bucket_sums(keys, seconds, size):
+    """Work seconds and session counts summed per key, keys being ints
+    below size."""
+    totals = [0] * size
+    counts = [0] * size
+    for key, value in zip(keys, seconds):
+        totals[key] += value
+        counts[key] += 1
+    return totals, counts
+
+
+def spread_sums(columns, by):
+    """Work seconds and session counts per weekday (Monday 0) or local
+    hour. A session's seconds are split over the hours it ran through in
+    proportion to the time spent in each, and it counts once in every
+    bucket it reaches."""
+    size = 7 if by == "weekday" else 24
+    totals = [0] * size
+    counts = [0] * size
+    for started, stopped, seconds in zip(columns.started, columns.stopped, columns.seconds):
+        span_seconds = stopped - started
+        reached = set()
+        moment = started
+        given = 0
+        while True:
+            local = time.localtime(moment)
+            key = local.tm_wday if by == "weekday" else local.tm_hour
+            # Up to the next local hour, localtime takes care of DST and
+            # odd offsets
+            piece_end = min(moment + 3600 - local.tm_min * 60 - local.tm_sec, stopped)
+            # Shares are cut from the running total so they add up exactly
+            share_end = seconds if piece_end == stopped else seconds * (piece_end - started) // span_seconds
+            totals[key] += share_end - given
+            given = share_end
+            reached.add(key)
+            if piece_end == stopped:
+                break
+            moment = piece_end
+        for key in reached:
+            counts[key] += 1
+    return totals, counts
+
+
+def task_labels(task, by):
+    # The groups a task counts for, tasks can have several comma separated tags
+    if by == "task":
+        return [task["text"]]
+    if by == "tag":
+        return [tag.strip() for tag in (task.get("tag") or "").split(",") if tag.strip()] or [NO_VALUE]
+    return [task.get(by) or NO_VALUE]
+
+
+def group_seconds(columns, by):
+    """[(label, seconds, sessions)] for every group with work in columns,
+    weekdays and hours in their natural order, other groups by most work."""
+    if by == "weekday":
+        totals, counts = spread_sums(columns, by)
+        labels = list(calendar.day_name)
+    elif by == "hour":
+        totals, counts = spread_sums(columns, by)
+        labels = [f"{hour:02d}:00" for hour in range(24)]
+    else:
+        # Sessions are reduced per task first, then the few task totals
+        # are added to their groups
+        task_totals, task_counts = bucket_sums(columns.task_positions, columns.seconds,
+                                               len(columns.tasks))
+        labels = []
+        label_keys = {}
+        totals = []
+        counts = []
+        for task, seconds, count in zip(columns.tasks, task_totals, task_counts):
+            for label in task_labels(task, by):
+                # Tasks sharing a text are still separate tasks
+                key = task["global_id"] if by == "task" else label
+                if key not in label_keys:
+                    label_keys[key] = len(labels)
+                    labels.append(label)
+                    totals.append(0)
+                    counts.append(0)
+                totals[label_keys[key]] += seconds
+                counts[label_keys[key]] += count
+    rows = [row for row in zip(labels, totals, counts) if row[2]]
+    if by not in ("weekday", "hour"):
+        rows.sort(key=lambda row: row[1], reverse=True)
+    return rows
+
+
+def grouped_stats(store, first_date, last_date, by):
+    """The stats print_grouped_stats shows, as a JSON friendly dict so they
+    can be cached."""
+    with span("lookup"):
+        columns = SessionColumns.from_store(store, first_date, last_date)
+    with span("aggregate"):
+        return {"rows": group_seconds(columns, by), "seconds": sum(columns.seconds),
+                "sessions": len(columns.seconds)}
+
+
+def print_grouped_stats(stats, first_date, last_date, by):
+    if not stats["sessions"]:
+        print(f"No work recorded from {first_date} to {last_date}.")
+        return
+    rows = stats["rows"]
+    total = stats["seconds"]
+    width = min(40, max(len(by), *(len(label) for label, _, _ in rows)))
+    print(f"Work hours by {by} from {first_date} to {last_date}")
+    print(f"{by.capitalize():<{width}}  {'Hours':>8}  {'Sessions':>8}  {'Share':>6}")
+    for label, seconds, count in rows:
+        print(f"{label[:width]:<{width}}  {seconds / 3600:>8.1f}  {count:>8}  {seconds / total:>6.0%}")
+    print(f"Sum: {round(total / 3600, 1)} hours in {stats['sessions']} sessions")
@@ -0,0 +1,146 @@
+import os
+from datetime import datetime, timedelta
+from chronotask_nsx116.models import decode_task, task_sessions
+from chronotask_nsx116.serializers import CODECS
+
+
+def get_closed_at(task):
+    # When a done or dismissed task was closed, None for active tasks
+    if task["status"] == "done":
+        return task.get("date_done")
+    if task["status"] == "dismissed":
+        return task.get("date_dismissed")
+    return None
+
+
+def is_archivable(task, age_days):
+    closed_at = get_closed_at(task)
+    if not closed_at:
+        return False
+    cutoff = (datetime.now() - timedelta(days=age_days)).strftime("%Y-%m-%d %H:%M:%S")
+    return closed_at < cutoff
+
+
+def session_span(tasks):
+    # [first, last] start in epoch seconds of the tasks' sessions, None
+    # when they have none
+    starts = [session.started for task in tasks if task.get("sessions")
+              for session in task_sessions(task)]
+    return [min(starts), max(starts)] if starts else None
+
+
+class Archive:
+    """Done and dismissed tasks moved out of data.json, one segment file
+    per month they were closed in (archive/YYYY-MM.json). Segments are only
+    read when archived tasks are asked for.
+
+    Sessions can be logged long after a task was closed, so the first and
+    last session start of every segment are kept in archive/spans.idx for
+    session queries to pick segments by."""
+
+    def __init__(self, archive_dir):
+        self.archive_dir = archive_dir
+        self.spans_file = os.path.join(archive_dir, "spans.idx")
+        self.tasks_by_id = None  # Loaded on the first lookup
+        self.spans = None  # segment name -> session span, read on first use
+
+    def segment_files(self):
+        """Segment paths from the most recent month to the oldest."""
+        if not os.path.isdir(self.archive_dir):
+            return []
+        names = sorted((name for name in os.listdir(self.archive_dir) if name.endswith(".json")),
+                       reverse=True)
+        return [os.path.join(self.archive_dir, name) for name in names]
+
+    def reset(self):
+        # Forgets what was read, the segments changed on disk
+        self.tasks_by_id = None
+        self.spans = None
+
+    def read_spans(self):
+        if self.spans is None:
+            try:
+                with open(self.spans_file, 'rb') as file:
+                    self.spans = CODECS["compact"].loads(file.read())["spans"]
+            except (OSError, ValueError, KeyError):
+                # Archives written before the spans were kept
+                self.spans = {}
+        return self.spans
+
+    def set_span(self, segment_file, tasks):
+        # A segment left without tasks is removed, so is its span
+        spans = self.read_spans()
+        if tasks:
+            spans[os.path.basename(segment_file)] = session_span(tasks)
+        else:
+            spans.pop(os.path.basename(segment_file), None)
+        tmp_file = self.spans_file + ".tmp"
+        with open(tmp_file, 'wb') as file:
+            file.write(CODECS["compact"].dumps({"spans": spans}))
+        os.replace(tmp_file, self.spans_file)
+
+    def has_sessions_between(self, segment_file, first, last):
+        # Segments without a recorded span are read to be safe
+        name = os.path.basename(segment_file)
+        spans = self.read_spans()
+        if name not in spans:
+            return True
+        return spans[name] is not None and spans[name][0] < last and spans[name][1] >= first
+
+    def has_tasks(self):
+        return bool(self.segment_files())
+
+    def load_segment(self, segment_file):
+        with open(segment_file, 'rb') as file:
+            return [decode_task(task) for task in CODECS["compact"].loads(file.read())["tasks"]]
+
+    def save_segment(self, segment_file, tasks):
+        tmp_file = segment_file + ".tmp"
+        with open(tmp_file, 'wb') as file:
+            file.write(CODECS["compact"].dumps({"tasks": tasks}))
+        os.replace(tmp_file, segment_file)
+        self.set_span(segment_file, tasks)
+
+    def iter_tasks(self, statuses=None, sessions_between=None):
+        """Streams archived tasks segment by segment, recents first. With
+        sessions_between, (first, last) epoch seconds, only the segments
+        that may hold sessions started in [first, last) are read."""
+        for segment_file in self.segment_files():
+            if sessions_between and not self.has_sessions_between(segment_file, *sessions_between):
+                continue
+            for task in reversed(self.load_segment(segment_file)):
+                if statuses is None or task["status"] in statuses:
+                    yield task
+
+    def find(self, global_id):
+        if self.tasks_by_id is None:
+            self.tasks_by_id = {task["global_id"]: task for task in self.iter_tasks()}
+        return self.tasks_by_id.get(global_id)
+
+    def add(self, tasks):
+        """Appends tasks to the segments of the months they were closed in."""
+        os.makedirs(self.archive_dir, exist_ok=True)
+        by_month = {}
+        for task in tasks:
+            by_month.setdefault(get_closed_at(task)[:7], []).append(task)
+        for month, month_tasks in by_month.items():
+            segment_file = os.path.join(self.archive_dir, f"{month}.json")
+            existing = self.load_segment(segment_file) if os.path.exists(segment_file) else []
+            self.save_segment(segment_file, existing + month_tasks)
+        self.tasks_by_id = None
+
+    def remove(self, global_id):
+        """Takes a task out of its segment and returns it, None if it isn't
+        archived."""
+        task = self.find(global_id)
+        if not task:
+            return None
+        segment_file = os.path.join(self.archive_dir, f"{get_closed_at(task)[:7]}.json")
+        remaining = [item for item in self.load_segment(segment_file) if item["global_id"] != global_id]
+        if remaining:
+            self.save_segment(segment_file, remaining)
+        else:
+            os.remove(segment_file)
+            self.set_span(segment_file, [])
+        del self.tasks_by_id[global_id]
+        return task
@@ -1,20 +1,58 @@
 import argparse
+import calendar
 from datetime import datetime
+from chronotask_nsx116.store import migrate_to_sqlite
+from chronotask_nsx116.aggregate import GROUP_BY
+from chronotask_nsx116.notifications import NOTIFICATION_SINKS
+from chronotask_nsx116.query import TaskQuery
 
 
-def parse_args():
+def id_range(value):
+    # "5" -> [5], "8-14" -> [8, ..., 14]
+    try:
+        first, _, last = value.partition("-")
+        first, last = int(first), int(last or first)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid ID or range: '{value}'")
+    if first > last:
+        raise argparse.ArgumentTypeError(f"range '{value}' ends before it starts")
+    return list(range(first, last + 1))
+
+def iso_date(value):
+    # "2024-11-15", checked so filters don't compare against typos
+    try:
+        datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid date '{value}', use YYYY-MM-DD")
+    return value
+
+def sink_list(value):
+    # "desktop,bell" -> checked against the known sinks
+    unknown = [name for name in value.split(",") if name not in NOTIFICATION_SINKS]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown notification sink: {', '.join(unknown)}")
+    return value
+
+def parse_args(argv=None):
     parser = argparse.ArgumentParser(
         description="A task management and pomodoro timer app.",
         epilog=(
             "Examples:\n"
             "  chronotask add 'Complete project report' --date 2024-11-15 --project Work --tag Important\n"
             "  chronotask list --status active done\n"
+            "  chronotask list --status all --limit 20 --offset 20\n"
+            "  chronotask list --project Work --due-before 2024-11-30 --min-value 3\n"
+            "  chronotask search report --status all\n"
             "  chronotask id 3 done\n"
             "  chronotask set --work=25 --short-rest=5 --long-rest=15 --pomodoros=4 --inactivity=90\n"
             "  chronotask stats 2024-11\n"
         ),
         formatter_class=argparse.RawTextHelpFormatter
     )
+    parser.add_argument("--profile", action="store_true",
+                        help="Print where the command spent its time to standard error")
+    parser.add_argument("--profile-output", metavar="FILE",
+                        help="With --profile, also write the timings and counters as JSON to FILE")
 
     # Create a subparser for main commands
     subparsers = parser.add_subparsers(dest="command", help="Available commands")
@@ -37,10 +75,56 @@ def parse_args():
         choices=['all', 'active', 'done', 'dismissed'],
         help="Task status to filter by (default: active)"
     )
+    list_parser.add_argument("--limit", type=int, help="Show at most this many tasks")
+    list_parser.add_argument("--offset", type=int, default=0, help="Skip this many tasks first")
+    list_parser.add_argument("--since", "--added-after", dest="added_after", type=iso_date, metavar="YYYY-MM-DD",
+                             help="Only tasks added on or after this date")
+    list_parser.add_argument("--added-before", type=iso_date, metavar="YYYY-MM-DD",
+                             help="Only tasks added on or before this date")
+    list_parser.add_argument("--done-after", type=iso_date, metavar="YYYY-MM-DD",
+                             help="Only tasks done on or after this date")
+    list_parser.add_argument("--done-before", type=iso_date, metavar="YYYY-MM-DD",
+                             help="Only tasks done on or before this date")
+    list_parser.add_argument("--due-after", type=iso_date, metavar="YYYY-MM-DD",
+                             help="Only tasks due on or after this date")
+    list_parser.add_argument("--due-before", type=iso_date, metavar="YYYY-MM-DD",
+                             help="Only tasks due on or before this date")
+    list_parser.add_argument("--project", help="Only tasks of this project")
+    list_parser.add_argument("--tag", help="Only tasks with this tag")
+    list_parser.add_argument("--min-value", type=float, help="Only tasks with at least this value")
+    list_parser.add_argument(
+        "--format",
+        choices=["table", "tsv", "jsonl"],
+        default="table",
+        help="Output format, tsv and jsonl print one task per line for scripts"
+    )
+
+    # Search tasks
+    search_parser = subparsers.add_parser("search", help="Find tasks by words of their text, project or tag")
+    search_parser.add_argument("terms", nargs="+",
+                               help="Words to look for, each also matches the words starting with it")
+    search_parser.add_argument(
+        "--status",
+        nargs="*",
+        choices=["all", "active", "done", "dismissed"],
+        help="Task status to filter by (default: all)"
+    )
+    search_parser.add_argument("--limit", type=int, default=20, help="Show at most this many tasks (default: 20)")
+    search_parser.add_argument("--format", choices=["table", "tsv", "jsonl"], default="table",
+                               help="Output format, tsv and jsonl print one task per line for scripts")
 
     # Actions for a specific task by ID
-    id_parser = subparsers.add_parser("id", help="Actions for a specific task")
-    id_parser.add_argument("task_id", type=int, help="ID of the task to operate on")
+    id_parser = subparsers.add_parser("id", help="Actions for tasks by ID or filter")
+    id_parser.add_argument("task_ids", nargs="*", type=id_range, metavar="ID",
+                           help="IDs or ranges of the tasks to operate on, e.g. 3 5 8-14")
+    # dest differs from the mod options, which share the namespace
+    id_parser.add_argument("--project", dest="filter_project", metavar="PROJECT",
+                           help="Only tasks of this project")
+    id_parser.add_argument("--tag", dest="filter_tag", metavar="TAG", help="Only tasks with this tag")
+    # Repeated rather than nargs, which would swallow the action after it
+    id_parser.add_argument("--status", dest="filter_status", action="append",
+                           choices=["active", "done", "dismissed"],
+                           help="Only tasks with this status, can be repeated, active by default with --project or --tag")
     id_subparsers = id_parser.add_subparsers(dest="task_action", help="Actions for the task")
     id_subparsers.required = True
 
@@ -55,7 +139,7 @@ def parse_args():
     mod_parser.add_argument("--tag", help="New tag")
     mod_parser.add_argument("--value", type=int, help="New value or priority")
     id_subparsers.add_parser("delete", help="Delete a task")
-    id_subparsers.add_parser("start", help="Start a task")
+    id_subparsers.add_parser("start", help="Start a task, takes a single ID")
 
     # -------------------- POMODORO TIMER SETTINGS --------------------
     set_parser = subparsers.add_parser("set", help="Set pomodoro-timer settings, without arguments prints current settings")
@@ -64,6 +148,13 @@ def parse_args():
     set_parser.add_argument("--long-rest", type=int, help="Long rest duration in minutes")
     set_parser.add_argument("--pomodoros", type=int, help="Pomodoros count before long rest")
     set_parser.add_argument("--inactivity", type=int, help="Inactivity duration in seconds to stop activity timer")
+    set_parser.add_argument("--archive-after", type=int, help="Days after which done and dismissed tasks are archived")
+    set_parser.add_argument("--activity-source", choices=["input", "idle"],
+                            help="Detect activity from input events or by polling the X idle counter")
+    set_parser.add_argument("--data-format", choices=["compact", "pretty"],
+                            help="Write data.json compact (default) or indented")
+    set_parser.add_argument("--notify", type=sink_list,
+                            help=f"Comma separated notification sinks: {', '.join(NOTIFICATION_SINKS)}")
 
     # -------------------- STATISTICS --------------------
     stats_parser = subparsers.add_parser("stats", help="Display monthly statistics")
@@ -74,8 +165,36 @@ def parse_args():
         help="Year and month for statistics (format: YYYY-MM). Defaults to \
         current month if not provided"
     )
+    stats_parser.add_argument("--by", choices=GROUP_BY,
+                              help="Break work down by project, tag, task, weekday or hour")
+    stats_parser.add_argument("--from", dest="first_date", metavar="YYYY-MM-DD",
+                              help="First day of the breakdown, start of the month by default")
+    stats_parser.add_argument("--to", dest="last_date", metavar="YYYY-MM-DD",
+                              help="Last day of the breakdown, end of the month by default")
+    stats_parser.add_argument(
+        "--rebuild",
+        action="store_true",
+        help="Regenerate the daily work rollup from the task sessions first"
+    )
+
+    # -------------------- STORAGE --------------------
+    subparsers.add_parser("migrate", help="Move tasks from data.json into the indexed SQLite store")
+    subparsers.add_parser("archive", help="Move old done and dismissed tasks to the monthly archive")
+    export_parser = subparsers.add_parser("export", help="Write all tasks as JSON, TaskWarrior JSON or CSV")
+    export_parser.add_argument("--output", "-o", help="File to write, standard output by default")
+    export_parser.add_argument("--format", choices=["json", "taskwarrior", "csv"], default="json",
+                               help="Indented chronotask JSON (default), `task import` JSON or CSV")
+    import_parser = subparsers.add_parser("import", help="Add tasks from a TaskWarrior export or a CSV file")
+    import_parser.add_argument("file", help="File to read, - for standard input")
+    import_parser.add_argument("--format", choices=["taskwarrior", "csv"],
+                               help="Input format, CSV for .csv files and TaskWarrior JSON otherwise")
 
-    return parser.parse_args()
+    # -------------------- DAEMON --------------------
+    daemon_parser = subparsers.add_parser("daemon", help="Serve commands from memory over a Unix socket")
+    daemon_parser.add_argument("--stop", action="store_true", help="Stop the running daemon")
+    subparsers.add_parser("stop", help="Stop the timer running in the daemon")
+
+    return parser.parse_args(argv)
 
 
 # Commands
@@ -90,35 +209,67 @@ def handle_list(manager, args):
     # now = datetime.now()
     # year, month = now.year, now.month
     # manager.stats(year, month)
-    manager.list_tasks(args.status)       
+    manager.list_tasks(
+        args.status,
+        limit=args.limit,
+        offset=args.offset,
+        query=TaskQuery(
+            project=args.project,
+            tag=args.tag,
+            due_after=args.due_after,
+            due_before=args.due_before,
+            min_value=args.min_value,
+            added_after=args.added_after,
+            added_before=args.added_before,
+            done_after=args.done_after,
+            done_before=args.done_before,
+        ),
+        output_format=args.format,
+    )
+
+def handle_search(manager, args):
+    manager.search_tasks(" ".join(args.terms), args.status, limit=args.limit,
+                         output_format=args.format)
 
 def handle_id_command(manager, args):
-    # Handle task-specific actions based on task ID.
-    if args.task_action == "done":
-        manager.mark_task_done(args.task_id)
-        # print(f"Marking task {args.task_id} as done")
+    # Handle task actions for every selected task, written in one commit
+    current_ids = [current_id for ids in args.task_ids for current_id in ids]
+    if args.task_action == "start":
+        if len(current_ids) != 1:
+            print("Start takes exactly one task ID.")
+            return
+        print(f"Starting task {current_ids[0]} at {datetime.now().strftime('%Y-%m-%d %H:%M')}")
+        manager.start_task(current_ids[0])
+        return
+    if not current_ids and not (args.filter_project or args.filter_tag or args.filter_status):
+        # Without IDs or a filter every active task would be selected
+        print("Give task IDs or a --project, --tag or --status filter.")
+        return
+    task_ids = manager.select_tasks(current_ids, project=args.filter_project,
+                                    tag=args.filter_tag, statuses=args.filter_status)
+    if not task_ids:
+        print("No matching tasks.")
+    elif args.task_action == "done":
+        manager.mark_tasks_done(task_ids)
     elif args.task_action == "dismiss":
-        manager.dismiss_task(args.task_id)
-        print(f"Dismissing task {args.task_id}")
+        manager.dismiss_tasks(task_ids)
     elif args.task_action == "active":
-        manager.mark_task_active(args.task_id)
-        print(f"Marking task {args.task_id} active")
+        manager.mark_tasks_active(task_ids)
     elif args.task_action == "mod":
-        manager.modify_task(
-            args.task_id,
+        changed = manager.modify_tasks(
+            task_ids,
             text=args.text,
             due_date=args.date,
             project=args.project,
             tag=args.tag,
             value=args.value
-            )              
-        print(f"Modifying task {args.task_id}")
+            )
+        if changed:
+            print(f"Modified {len(task_ids)} task(s).")
+        else:
+            print("Nothing to change, give --text, --date, --project, --tag or --value.")
     elif args.task_action == "delete":
-        manager.delete_task(args.task_id)
-        # print(f"Deleting task {args.task_id}")
-    elif args.task_action == "start":
-        print(f"Starting task {args.task_id} at {datetime.now().strftime('%Y-%m-%d %H:%M')}")
-        manager.start_task(args.task_id)
+        manager.delete_tasks(task_ids)
 
 def handle_set(manager, args):
     # Convert argument values to integers if they are provided, otherwise leave as None
@@ -128,15 +279,71 @@ def handle_set(manager, args):
         long_rest=int(args.long_rest) if args.long_rest else None,
         pomodoros=int(args.pomodoros) if args.pomodoros else None,
         inactivity=int(args.inactivity) if args.inactivity else None,
+        archive_after=int(args.archive_after) if args.archive_after else None,
+        activity_source=args.activity_source,
+        data_format=args.data_format,
+        notifications=args.notify,
     )
 
 def handle_stats(manager, args):
+    if args.rebuild:
+        manager.store.rebuild_rollup()
+        print("Work rollup rebuilt from task sessions.")
     try:
         if args.year_month is None:
             now = datetime.now()
             year, month = now.year, now.month
         else:
             year, month = map(int, args.year_month.split("-"))
-        manager.stats(year, month)
+        if args.by or args.first_date or args.last_date:
+            last_day = calendar.monthrange(year, month)[1]
+            first_date = args.first_date or f"{year:04d}-{month:02d}-01"
+            last_date = args.last_date or f"{year:04d}-{month:02d}-{last_day:02d}"
+            for value in (first_date, last_date):
+                datetime.strptime(value, "%Y-%m-%d")
+            manager.grouped_stats(first_date, last_date, args.by or "project")
+        else:
+            manager.stats(year, month)
     except ValueError:
-        print("Invalid format for year and month. Please use YYYY-MM (e.g., 2024-10).")
+        print("Invalid format for year and month. Please use YYYY-MM (e.g., 2024-10), "
+              "and YYYY-MM-DD for --from and --to.")
+
+def handle_migrate(manager, args):
+    migrate_to_sqlite(manager.files)
+
+def handle_archive(manager, args):
+    manager.archive_tasks()
+
+def handle_export(manager, args):
+    manager.export_data(args.output, args.format)
+
+def handle_import(manager, args):
+    manager.import_tasks(args.file, args.format)
+
+def handle_stop(manager, args):
+    manager.stop_task()
+
+def run_command(manager, args):
+    # TASK handling
+    if args.command == "add":
+        handle_add(manager, args)
+    elif args.command == "list":
+        handle_list(manager, args)
+    elif args.command == "search":
+        handle_search(manager, args)
+    elif args.command == "id":
+        handle_id_command(manager, args)
+    elif args.command == "set":
+        handle_set(manager, args)
+    elif args.command == "stats":
+        handle_stats(manager, args)
+    elif args.command == "migrate":
+        handle_migrate(manager, args)
+    elif args.command == "archive":
+        handle_archive(manager, args)
+    elif args.command == "export":
+        handle_export(manager, args)
+    elif args.command == "import":
+        handle_import(manager, args)
+    elif args.command == "stop":
+        handle_stop(manager, args)
@@ -1,27 +1,40 @@
+import sys
 from chronotask_nsx116.task_manager import TaskManager  
+from chronotask_nsx116.settings import Files
 from chronotask_nsx116.arguments import parse_args
-from chronotask_nsx116.arguments import handle_add
-from chronotask_nsx116.arguments import handle_list
-from chronotask_nsx116.arguments import handle_id_command
-from chronotask_nsx116.arguments import handle_set
-from chronotask_nsx116.arguments import handle_stats
+from chronotask_nsx116.arguments import run_command
+from chronotask_nsx116.client import send_command, stop_daemon
+from chronotask_nsx116.profiling import PROFILER
 
 def main():
     args = parse_args()
-    manager = TaskManager()
+    files = Files()
 
+    if args.command == "daemon":
+        if args.stop:
+            if not stop_daemon(files.socket_file):
+                print("No daemon is running.")
+            return
+        from chronotask_nsx116.daemon import run_daemon  # asyncio is only needed by the daemon
+        run_daemon(files)
+        return
 
-    # TASK handling
-    if args.command == "add":
-        handle_add(manager, args)
-    elif args.command == "list":
-        handle_list(manager, args)
-    elif args.command == "id":
-        handle_id_command(manager, args)
-    elif args.command == "set":
-        handle_set(manager, args)
-    elif args.command == "stats":
-        handle_stats(manager, args)
+    # A running daemon serves the command from memory, otherwise the files
+    # are read directly. Standard input can't be passed on to the daemon.
+    if not (args.command == "import" and args.file == "-"):
+        output = send_command(files.socket_file, sys.argv[1:])
+        if output is not None:
+            print(output, end='')
+            return
+
+    if args.profile:
+        PROFILER.enable()
+    try:
+        manager = TaskManager()
+        run_command(manager, args)
+    finally:
+        if args.profile:
+            PROFILER.report(args.profile_output)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,35 @@
+import json
+import os
+import socket
+
+
+def request(socket_file, message):
+    """Sends one JSON line to the daemon and returns its decoded reply, None
+    if no daemon listens on socket_file."""
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(socket_file)
+            sock.sendall((json.dumps(message) + "\n").encode())
+            with sock.makefile("r") as reader:
+                reply = reader.readline()
+    except (FileNotFoundError, ConnectionRefusedError):
+        return None
+    if not reply:
+        # The command may or may not have run, so it isn't retried locally
+        return {"output": "The daemon closed the connection without a reply.\n"}
+    return json.loads(reply)
+
+
+def send_command(socket_file, argv):
+    """Runs CLI arguments in the daemon and returns what they printed, None
+    if no daemon is running."""
+    reply = request(socket_file, {"argv": argv, "cwd": os.getcwd()})
+    return None if reply is None else reply["output"]
+
+
+def stop_daemon(socket_file):
+    return request(socket_file, {"stop": True}) is not None
+
+
+def daemon_running(socket_file):
+    return request(socket_file, {"ping": True}) is not None
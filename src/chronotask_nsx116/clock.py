@@ -0,0 +1,35 @@
+import time
+
+
+class SystemClock:
+    """Real time. monotonic() measures intervals, time() gives the epoch
+    seconds written to sessions."""
+
+    wait = None  # The scheduler sleeps on its own wakeup event
+
+    def monotonic(self):
+        return time.monotonic()
+
+    def time(self):
+        return time.time()
+
+
+class SimulatedClock:
+    """Time that only moves when the scheduler waits, so hours of timer
+    events run in milliseconds. Runs on it need an end time, see
+    Scheduler.run."""
+
+    def __init__(self, epoch=None):
+        self.epoch = time.time() if epoch is None else epoch
+        self.elapsed = 0.0
+
+    def monotonic(self):
+        return self.elapsed
+
+    def time(self):
+        return self.epoch + self.elapsed
+
+    def wait(self, timeout):
+        # Nothing can happen before the next deadline on a single thread
+        self.elapsed += timeout
+        return False
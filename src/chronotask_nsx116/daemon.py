@@ -0,0 +1,139 @@
+import asyncio
+import io
+import json
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from chronotask_nsx116.task_manager import TaskManager
+from chronotask_nsx116.arguments import parse_args, run_command
+from chronotask_nsx116.client import daemon_running
+from chronotask_nsx116.profiling import PROFILER
+
+# Parsed arguments holding file paths
+PATH_ARGUMENTS = ["output", "file", "profile_output"]
+
+
+class CommandOutput:
+    """Stands in for sys.stdout and sys.stderr in the daemon. What a client
+    command prints is collected and sent back to that client, prints from
+    the timer threads go to the daemon's own terminal."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.local = threading.local()
+
+    def target(self):
+        buffer = getattr(self.local, "buffer", None)
+        return self.stream if buffer is None else buffer
+
+    def write(self, text):
+        return self.target().write(text)
+
+    def flush(self):
+        self.target().flush()
+
+    def __getattr__(self, name):
+        return getattr(self.target(), name)
+
+
+class Daemon:
+    """Keeps one TaskManager loaded and runs CLI commands sent over a Unix
+    socket. Commands run one at a time on a single worker thread, so every
+    write to the data files comes from this process."""
+
+    def __init__(self, files):
+        self.files = files
+        self.manager = TaskManager()
+        self.manager.daemon = True  # Timers run in the background, see stop_task
+        self.manager.store.long_lived = True  # Query indexes serve every command
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.stdout = CommandOutput(sys.stdout)
+        self.stderr = CommandOutput(sys.stderr)
+        self.server = None
+
+    def run_command(self, argv, cwd):
+        buffer = io.StringIO()
+        self.stdout.local.buffer = self.stderr.local.buffer = buffer
+        try:
+            args = parse_args(argv)
+            # File arguments are relative to the client's directory
+            for name in PATH_ARGUMENTS:
+                if getattr(args, name, None) not in (None, "-"):
+                    setattr(args, name, os.path.join(cwd, getattr(args, name)))
+            if args.profile:
+                PROFILER.enable()
+            try:
+                with self.manager.write_lock:
+                    # Standard input imports run in the client's own process
+                    self.manager.refresh()
+                    run_command(self.manager, args)
+                    # A running timer turns on batching, flush so nothing is
+                    # held in memory between commands
+                    self.manager.store.flush()
+            finally:
+                if args.profile:
+                    PROFILER.report(args.profile_output)
+                    PROFILER.disable()
+        except SystemExit:
+            pass  # argparse already printed the usage message
+        except Exception as e:
+            print(f"Command failed: {e}")
+        finally:
+            self.stdout.local.buffer = self.stderr.local.buffer = None
+        return buffer.getvalue()
+
+    async def handle_client(self, reader, writer):
+        try:
+            message = json.loads(await reader.readline())
+            if message.get("ping"):
+                reply = {"output": ""}
+            elif message.get("stop"):
+                reply = {"output": ""}
+                self.server.close()
+            else:
+                loop = asyncio.get_running_loop()
+                output = await loop.run_in_executor(self.executor, self.run_command,
+                                                    message["argv"], message.get("cwd", os.getcwd()))
+                reply = {"output": output}
+        except (ValueError, KeyError):
+            reply = {"output": "Invalid request.\n"}
+        writer.write((json.dumps(reply) + "\n").encode())
+        await writer.drain()
+        writer.close()
+
+    async def serve(self):
+        self.server = await asyncio.start_unix_server(self.handle_client, path=self.files.socket_file)
+        os.chmod(self.files.socket_file, 0o600)
+        print(f"Daemon listening on {self.files.socket_file}")
+        try:
+            await self.server.serve_forever()
+        except asyncio.CancelledError:
+            pass
+
+    def shutdown(self):
+        self.executor.shutdown()
+        with self.manager.write_lock:
+            if self.manager.timer and not self.manager.timer.stop_timer:
+                self.manager.stop_task()
+            self.manager.store.flush()
+        if os.path.exists(self.files.socket_file):
+            os.remove(self.files.socket_file)
+
+
+def run_daemon(files):
+    if daemon_running(files.socket_file):
+        print("A daemon is already running.")
+        return
+    if os.path.exists(files.socket_file):
+        os.remove(files.socket_file)  # Left behind by a daemon that was killed
+    daemon = Daemon(files)
+    sys.stdout, sys.stderr = daemon.stdout, daemon.stderr
+    try:
+        asyncio.run(daemon.serve())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        daemon.shutdown()
+        sys.stdout, sys.stderr = daemon.stdout.stream, daemon.stderr.stream
+        print("Daemon stopped.")
@@ -1,7 +1,7 @@
-from datetime import datetime
-from pynput import mouse, keyboard
-import time
 import threading
+import time
+from chronotask_nsx116.activity import make_activity_source
+from chronotask_nsx116.clock import SystemClock
 from chronotask_nsx116.interval_timer import IntervalTimer
 from chronotask_nsx116.settings import Settings, Files
 from chronotask_nsx116.writing_to_task import write_past_minutes_when_quit
@@ -10,92 +10,134 @@ from chronotask_nsx116.writing_to_task import write_at_start
 
 
 class FocusTrack:
-    def __init__(self, task_manager):
+    def __init__(self, task_manager, activity_source=None, clock=None):
+        self.clock = clock or SystemClock()  # A SimulatedClock in headless runs
         self.settings = task_manager.settings
+        self.store = task_manager.store  # Session writes reuse the loaded store
+        # Timer, quit and daemon command threads all write. The interval
+        # timer shares this lock so there is a single lock order
+        self.write_lock = task_manager.write_lock
         self.files = Files()
-        self.last_activity_time = time.time()
         self.stop_timer = False
         self.working = True
         self.activity_timer_pause = False
         self.pomodoro_summary = self.files.pomodoro_summary_file
         self.interval_timer = IntervalTimer(self)
+        self.scheduler = self.interval_timer.scheduler
+        self.activity_source = activity_source or make_activity_source(
+            self.settings.activity_source, self.scheduler.clock)
         self.activity_duration = self.interval_timer.activity_duration
         self.work_started_at = None
+        self.global_id = None
         self.sorted_ids = task_manager.sorted_ids
 
 
-    def reset_activity_timer(self):
-        """Resets the last activity time when there is user activity."""
-        self.last_activity_time = time.time()
+    def now_string(self):
+        return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.clock.time()))
 
     def check_inactivity(self):
-        """Checks for inactivity and pauses the timer if no activity is detected for inactivity_limit seconds."""
-        while not self.stop_timer:
-            if self.working:
-                if time.time() - self.last_activity_time > self.settings.inactivity_limit:  # Inactivity period
-                    if not self.activity_timer_pause:
-                        print("\r" + " " * 75, end='', flush=True)  # Overwrite with spaces
-                        print(f"\rNo activity for {self.settings.inactivity_limit} seconds, pausing timer {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", end='', flush=True)
-                        self.activity_timer_pause = True  # Pause the activity timer
-            time.sleep(1)  # Check every second
-
-    def update_activity_timer(self, global_id):
-        """Continuously updates the activity timer and logs every minute."""
-        while not self.stop_timer:
-            self.interval_timer.run(global_id)
-
-    def on_mouse_move(self, x, y):
-        """Handler for mouse movement activity."""
-        self.reset_activity_timer()
-        if self.activity_timer_pause and self.working:  # If timer is paused, resume it
+        """Runs at the inactivity deadline: pauses the timer if no activity
+        was seen for inactivity_limit seconds, otherwise moves the deadline
+        to inactivity_limit seconds after the last activity."""
+        with self.write_lock:
+            if self.stop_timer or not self.working or self.activity_timer_pause:
+                return
+            deadline = self.activity_source.last_activity_time() + self.settings.inactivity_limit
+            if self.scheduler.clock() < deadline:
+                self.scheduler.schedule("inactivity", deadline, self.check_inactivity)
+                return
             print("\r" + " " * 75, end='', flush=True)  # Overwrite with spaces
-            print(f"\rResuming timer due to mouse activity.{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", end='', flush=True)
-            self.activity_timer_pause = False
+            print(f"\rNo activity for {self.settings.inactivity_limit} seconds, pausing timer {self.now_string()}", end='', flush=True)
+            self.activity_timer_pause = True  # Pause the activity timer
+            self.interval_timer.pause_work()
 
-    def on_keyboard_event(self, key):
-        """Handler for keyboard activity."""
-        self.reset_activity_timer()
-        if self.activity_timer_pause and self.working:  # If timer is paused, resume it
-            print("\r" + " " * 75, end='', flush=True)  # Overwrite with spaces
-            print(f"\rResuming timer due to keyboard activity {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", end='', flush=True)
+    def resume_timer(self):
+        """Resumes work time counting and arms the inactivity deadline."""
+        with self.write_lock:
             self.activity_timer_pause = False
+            self.interval_timer.resume_work()
+            self.scheduler.schedule(
+                "inactivity",
+                self.activity_source.last_activity_time() + self.settings.inactivity_limit,
+                self.check_inactivity,
+            )
 
-    def start(self, current_id):
-        """Starts the timer, inactivity checker, and sets up activity listeners."""
+    def update_activity_timer(self, global_id):
+        """Runs the timer events until the timer is stopped."""
+        self.interval_timer.run(global_id)
+
+    def on_activity(self, kind):
+        """Called by the activity source, at most once per second. Only
+        resumes a paused timer, the inactivity check reads the last activity
+        time from the source itself."""
+        with self.write_lock:
+            # The pause flag only changes under the lock, see stop
+            if self.activity_timer_pause and self.working and not self.stop_timer:
+                print("\r" + " " * 75, end='', flush=True)  # Overwrite with spaces
+                print(f"\rResuming timer due to {kind} activity {self.now_string()}", end='', flush=True)
+                self.resume_timer()
+
+    def start(self, current_id, wait_for_quit=True):
+        """Starts the timer, inactivity checker, and sets up activity listeners.
+        Without wait_for_quit it returns right away and the session runs
+        until stop() is called."""
 
-        self.work_started_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         global_id = get_global_id_by_current_id(current_id, self.sorted_ids)
-        write_at_start(global_id, self.work_started_at)
-
-        self.activity_timer_pause = False  # Start the timer immediately
-
-        # Set up mouse and keyboard listeners
-        mouse_listener = mouse.Listener(on_move=self.on_mouse_move)
-        keyboard_listener = keyboard.Listener(on_press=self.on_keyboard_event)
-
-        mouse_listener.start()
-        keyboard_listener.start()
-
-        # Start the inactivity checker thread
-        inactivity_thread = threading.Thread(target=self.check_inactivity, daemon=True) # daemon=True added
-        inactivity_thread.start()
+        self.begin(global_id)
 
-        # Start the activity timer thread (no recursion, just a loop)
+        # Start the timer thread, it sleeps until the next work, rest or
+        # inactivity deadline
         activity_timer_thread = threading.Thread(target=self.update_activity_timer, args=(global_id,))
         activity_timer_thread.start()
+        if not wait_for_quit:
+            return
 
         # Start the thread that waits for user input to quit
         quit_thread = threading.Thread(target=self.wait_for_quit_input, args=(global_id,))
         quit_thread.start()
 
         # Join threads to allow for clean shutdown
-        # inactivity_thread.join()
         activity_timer_thread.join()
         quit_thread.join()
 
         # Stop the listeners when the program exits
-        mouse_listener.stop()
-        keyboard_listener.stop()
+        self.activity_source.stop()
+
+    def begin(self, global_id):
+        """Opens the session of the task and starts counting work and
+        watching for activity. The events run in update_activity_timer."""
+        self.work_started_at = int(self.clock.time())
+        self.global_id = global_id
+        # Session updates are buffered and flushed at pomodoro end, quit
+        # and every checkpoint
+        self.store.batching = True
+        write_at_start(self.store, global_id, self.work_started_at)
+        self.store.flush()
+
+        self.resume_timer()  # Start the timer immediately
+
+        # Start watching for mouse and keyboard activity
+        self.activity_source.start(self.scheduler, self.on_activity)
+
+    def stop(self):
+        """Stops the timer and the activity source and writes the work not
+        recorded yet. Everything runs under the write lock the timer events
+        take, so an event already taken off the scheduler finds the timer
+        stopped and can't write the session again."""
+        with self.write_lock:
+            self.stop_timer = True
+            self.interval_timer.stop()
+            self.interval_timer.pause_work()
+            write_past_minutes_when_quit(
+                self.store,
+                self.global_id,
+                self.interval_timer.activity_duration - self.interval_timer.recorded_duration,
+                self.clock.time(),
+            )
+            self.store.flush()
+            self.store.batching = False
+        # Outside the lock, input listeners may be waiting for it in on_activity
+        self.activity_source.stop()
 
     def wait_for_quit_input(self, global_id):
         """Waits for user input 'q' and stops the timer. Without the first line
@@ -106,15 +148,12 @@ class FocusTrack:
             try:
                 user_input = input().strip().lower()
                 if user_input == 'q':
-                    self.stop_timer = True
-                    write_past_minutes_when_quit(
-                        global_id,
-                        self.interval_timer.activity_duration,
-                    )
+                    self.stop()
                     print("Timer stopped.")
                 else:
                     print("Invalid input. Type 'q' to stop the timer.")
             except KeyboardInterrupt:
                 print("\nExiting due to keyboard interrupt.")
                 self.stop_timer = True
+                self.interval_timer.stop()
                 break
@@ -0,0 +1,188 @@
+import calendar
+import csv
+import json
+import time
+import uuid
+from chronotask_nsx116.models import TIMESTAMP_FORMAT, encode, to_epoch
+
+TASKWARRIOR_FORMAT = "%Y%m%dT%H%M%SZ"  # UTC, as in `task export`
+
+# TaskWarrior status -> chronotask status
+STATUS_FROM_TASKWARRIOR = {
+    "pending": "active",
+    "waiting": "active",
+    "recurring": "active",
+    "completed": "done",
+    "deleted": "dismissed",
+}
+STATUS_TO_TASKWARRIOR = {"active": "pending", "done": "completed", "dismissed": "deleted"}
+PRIORITY_TO_VALUE = {"H": 3, "M": 2, "L": 1}
+
+CSV_COLUMNS = ["global_id", "text", "status", "date", "project", "tag", "value",
+               "date_added", "date_done", "date_dismissed", "work_seconds"]
+
+
+def from_taskwarrior_time(timestamp):
+    return time.strftime(TIMESTAMP_FORMAT, time.localtime(calendar.timegm(time.strptime(timestamp, TASKWARRIOR_FORMAT))))
+
+
+def to_taskwarrior_time(timestamp):
+    return time.strftime(TASKWARRIOR_FORMAT, time.gmtime(to_epoch(timestamp)))
+
+
+def new_task(**fields):
+    """A task dict with every field add_task sets, overridden by fields."""
+    date_added = time.strftime(TIMESTAMP_FORMAT)
+    task = {"text": "", "date": date_added[:10], "project": None, "tag": None, "value": None,
+            "global_id": str(uuid.uuid4()), "date_added": date_added, "date_done": None,
+            "date_dismissed": None, "status": "active", "work_seconds": 0, "sessions": []}
+    task.update((key, value) for key, value in fields.items() if value is not None)
+    return task
+
+
+def iter_json_objects(file, chunk_size=64 * 1024):
+    """Yields the objects of a JSON array, or of one object per line, reading
+    the file chunk by chunk instead of all at once."""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    for chunk in iter(lambda: file.read(chunk_size), ""):
+        buffer += chunk
+        position = 0
+        while True:
+            # Skip whitespace and the array punctuation between objects
+            while position < len(buffer) and buffer[position] in " \t\r\n[],":
+                position += 1
+            if position == len(buffer):
+                break
+            try:
+                record, position_after = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                break  # The object continues in the next chunk
+            yield record
+            position = position_after
+        buffer = buffer[position:]
+    if buffer.strip(" \t\r\n[],"):
+        raise ValueError(f"Invalid JSON near: {buffer[:40]!r}")
+
+
+def int_value(value):
+    # "3" -> 3, the CLI stores --val as given. Anything else, "2.5" or
+    # "high", is kept as it is
+    if isinstance(value, str) and value.strip().isdigit():
+        return int(value)
+    return value
+
+
+def read_taskwarrior(file):
+    """Tasks from the output of `task export`."""
+    for record in iter_json_objects(file):
+        status = STATUS_FROM_TASKWARRIOR.get(record.get("status"), "active")
+        end = from_taskwarrior_time(record["end"]) if record.get("end") else None
+        yield new_task(
+            global_id=record.get("uuid"),
+            text=record.get("description", ""),
+            status=status,
+            date=from_taskwarrior_time(record["due"])[:10] if record.get("due") else None,
+            project=record.get("project"),
+            tag=",".join(record["tags"]) if record.get("tags") else None,
+            value=PRIORITY_TO_VALUE.get(record.get("priority")),
+            date_added=from_taskwarrior_time(record["entry"]) if record.get("entry") else None,
+            date_done=end if status == "done" else None,
+            date_dismissed=end if status == "dismissed" else None,
+        )
+
+
+def read_csv(file):
+    """Tasks from a CSV file with a header row of CSV_COLUMNS names, as
+    written by the csv export. Missing columns get their defaults."""
+    reader = csv.DictReader(file)
+    for row in reader:
+        fields = {column: row.get(column) or None for column in CSV_COLUMNS}
+        fields["value"] = int_value(fields["value"])
+        if fields["work_seconds"] is not None:
+            try:
+                fields["work_seconds"] = int(fields["work_seconds"])
+            except ValueError:
+                print(f"Skipped line {reader.line_num}: work_seconds '{fields['work_seconds']}' is not a number.")
+                continue
+        yield new_task(**fields)
+
+
+class JsonWriter:
+    """Indented chronotask JSON with the sessions, written a task at a time."""
+
+    with_sessions = True
+
+    def __init__(self, file, settings):
+        self.file = file
+        self.count = 0
+        settings_json = json.dumps(settings, indent=4).replace("\n", "\n    ")
+        file.write(f'{{\n    "settings": {settings_json},\n    "tasks": [')
+
+    def write(self, task):
+        task_json = json.dumps(task, indent=4, default=encode).replace("\n", "\n        ")
+        self.file.write(("," if self.count else "") + "\n        " + task_json)
+        self.count += 1
+
+    def finish(self):
+        self.file.write("\n    ]\n}\n")
+
+
+class TaskwarriorWriter:
+    """A JSON array `task import` reads."""
+
+    with_sessions = False
+
+    def __init__(self, file, settings):
+        self.file = file
+        self.count = 0
+        file.write("[")
+
+    def write(self, task):
+        record = {
+            "uuid": task["global_id"],
+            "description": task["text"],
+            "status": STATUS_TO_TASKWARRIOR.get(task["status"], "pending"),
+            "entry": to_taskwarrior_time(task["date_added"]),
+        }
+        end = task.get("date_done") or task.get("date_dismissed")
+        if end:
+            record["end"] = to_taskwarrior_time(end)
+        if task.get("date"):
+            record["due"] = to_taskwarrior_time(task["date"] + " 00:00:00")
+        if task.get("project"):
+            record["project"] = task["project"]
+        if task.get("tag"):
+            record["tags"] = task["tag"].split(",")
+        value = int_value(task.get("value"))
+        if value in (1, 2, 3):
+            record["priority"] = "LMH"[value - 1]
+        self.file.write(("," if self.count else "") + "\n" + json.dumps(record))
+        self.count += 1
+
+    def finish(self):
+        self.file.write("\n]\n")
+
+
+class CsvWriter:
+    with_sessions = False
+
+    def __init__(self, file, settings):
+        self.writer = csv.writer(file)
+        self.writer.writerow(CSV_COLUMNS)
+        self.count = 0
+
+    def write(self, task):
+        self.writer.writerow([task.get(column) for column in CSV_COLUMNS])
+        self.count += 1
+
+    def finish(self):
+        pass
+
+
+READERS = {"taskwarrior": read_taskwarrior, "csv": read_csv}
+WRITERS = {"json": JsonWriter, "taskwarrior": TaskwarriorWriter, "csv": CsvWriter}
+
+
+def guess_format(path):
+    return "csv" if path.lower().endswith(".csv") else "taskwarrior"
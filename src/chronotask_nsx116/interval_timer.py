@@ -1,25 +1,32 @@
-import os
-# Hides Pygame's greeting message
-os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = "hide"
-import pygame
-import time
-import subprocess
+from chronotask_nsx116.notifications import make_notifier
 from chronotask_nsx116.writing_to_task import write_total_activity_to_task
 from chronotask_nsx116.settings import Settings, Files
+from chronotask_nsx116.scheduler import Scheduler
 import chronotask_nsx116.data
 import importlib.resources
 
+# Seconds of work after which the running session is written to the store
+CHECKPOINT_INTERVAL = 5 * 60
+
 class IntervalTimer:
     def __init__(self, pomodoro_timer):  
-        pygame.mixer.init()
         self.timer = pomodoro_timer
         self.files = Files()
-        self.activity_duration = 0 # Activity since start  
-        self.rest_duration = 0     # Rest pause duration
+        # Events run at monotonic deadlines instead of a 1 second tick, work
+        # time is measured from elapsed intervals
+        self.scheduler = Scheduler(pomodoro_timer.clock.monotonic, pomodoro_timer.clock.wait)
+        self.clock = self.scheduler.clock
+        self.lock = pomodoro_timer.write_lock  # Scheduler, listener and command threads
+        self.work_elapsed = 0          # Work of the pomodoro before work_resumed_at
+        self.work_resumed_at = None    # None while paused or resting
+        self.rest_started_at = None    # None while working
+        self.recorded_duration = 0 # Activity already written to the store
+        self.global_id = None
         self.pomodoro_count = 0
         self.pomodoro_finish = False
         self.total_work_minutes = 0
         self.total_rest_minutes = 0
+        self.rest_seconds = 0  # Seconds of the finished rest pauses
         self.short_rest = False
         self.short_rest_start = False
         self.short_rest_finish = False
@@ -29,56 +36,156 @@ class IntervalTimer:
         self.long_rest_finish = False
         self.active_for_minute = False
         self.settings = pomodoro_timer.settings
+        self.store = pomodoro_timer.store
         with importlib.resources.as_file(importlib.resources.files(chronotask_nsx116.data) / 'notification.wav') as path:
             self.notification_sound = str(path)  # Convert to string if needed by your code
+        # Sent from a background thread, the sound is loaded there once
+        self.notifier = make_notifier(self.settings.notifications, self.notification_sound)
         self.pomodoro_summary = self.files.pomodoro_summary_file
 
-    def run(self, global_id):
-        self.update_activity_timer()
-        self.registrator(global_id)
-        time.sleep(1)
-
-    def update_activity_timer(self):
-        """Continuously updates the activity timer and logs every minute."""
-        if self.timer.working:
-            if not self.timer.activity_timer_pause:
-                self.activity_duration += 1
-                if self.activity_duration >= self.settings.work_duration:
-                    self.pomodoro_count += 1
-                    self.pomodoro_finish = True
-                    # Handle break logic
-                    if self.pomodoro_count % self.settings.pomodoros_before_long_rest == 0:
-                        self.long_rest = True
-                        self.long_rest_start = True
-                        self.change_to_rest()
-                    else:
-                        self.short_rest = True
-                        self.short_rest_start = True
-                        self.change_to_rest()
-                if self.activity_duration % 60 == 0:  # Log every 1 minute
-                    self.total_work_minutes += 1
-                    if 0 < self.activity_duration < self.settings.work_duration:
-                        self.active_for_minute = True
-        else:
-            self.rest_duration += 1
+    @property
+    def activity_duration(self):
+        """Work seconds of the current pomodoro."""
+        with self.lock:
+            duration = self.work_elapsed
+            if self.work_resumed_at is not None:
+                duration += self.clock() - self.work_resumed_at
+            return duration
+
+    @property
+    def rest_duration(self):
+        """Seconds of the current rest pause."""
+        with self.lock:
+            if self.rest_started_at is None:
+                return 0
+            return self.clock() - self.rest_started_at
+
+    def run(self, global_id, until=None):
+        """Runs the pomodoro cycle until the scheduler is stopped, or until
+        the monotonic clock reaches until."""
+        self.global_id = global_id
+        self.scheduler.run(until)
+
+    def stop(self):
+        self.scheduler.stop()
+        self.notifier.close()
+
+    def resume_work(self):
+        """Starts counting work time and schedules the pomodoro end, the next
+        minute log and the next checkpoint."""
+        with self.lock:
+            if not self.timer.working or self.work_resumed_at is not None:
+                return
+            now = self.clock()
+            self.work_resumed_at = now
+            unrecorded = self.work_elapsed - self.recorded_duration
+            self.scheduler.schedule("work_end", now + self.settings.work_duration - self.work_elapsed,
+                                    self.finish_work)
+            self.scheduler.schedule("checkpoint", now + CHECKPOINT_INTERVAL - unrecorded,
+                                    self.run_checkpoint)
+            self.schedule_work_minute()
+
+    def schedule_work_minute(self):
+        # Next full minute of work, the one ending the pomodoro is counted
+        # by finish_work
+        activity_duration = self.activity_duration
+        next_minute = (int(activity_duration + 0.001) // 60 + 1) * 60
+        if next_minute < self.settings.work_duration:
+            self.scheduler.schedule_in("work_minute", next_minute - activity_duration,
+                                       self.log_work_minute)
+
+    def pause_work(self):
+        """Stops counting work time, the elapsed interval is kept."""
+        with self.lock:
+            if self.work_resumed_at is None:
+                return
+            self.work_elapsed += self.clock() - self.work_resumed_at
+            self.work_resumed_at = None
+            for name in ("work_end", "work_minute", "checkpoint"):
+                self.scheduler.cancel(name)
+
+    def finish_work(self):
+        with self.lock:
+            if self.scheduler.stopped:
+                return  # Taken off the scheduler just before stop
+            self.pause_work()
+            self.total_work_minutes += 1
+            self.pomodoro_count += 1
+            self.pomodoro_finish = True
+            # Handle break logic
+            if self.pomodoro_count % self.settings.pomodoros_before_long_rest == 0:
+                self.long_rest = True
+                self.long_rest_start = True
+                self.change_to_rest()
+            else:
+                self.short_rest = True
+                self.short_rest_start = True
+                self.change_to_rest()
+            self.registrator(self.global_id)
+
+    def log_work_minute(self):
+        with self.lock:
+            if self.scheduler.stopped:
+                return
+            self.total_work_minutes += 1
+            self.active_for_minute = True
+            self.schedule_work_minute()
+            self.registrator(self.global_id)
+
+    def run_checkpoint(self):
+        with self.lock:
+            if self.scheduler.stopped:
+                return
+            self.checkpoint(self.global_id)
+            self.scheduler.schedule_in("checkpoint", CHECKPOINT_INTERVAL, self.run_checkpoint)
+
+    def finish_rest(self):
+        with self.lock:
+            if self.scheduler.stopped:
+                return
             if self.short_rest:
-                if self.rest_duration >= self.settings.short_rest_duration:
-                    self.short_rest_finish = True
-                    self.change_to_work()
+                self.short_rest_finish = True
             elif self.long_rest:
-                if self.rest_duration >= self.settings.long_rest_duration:
-                    self.long_rest_finish = True
-                    self.change_to_work()
-            if self.rest_duration % 60 == 0:
-                self.total_rest_minutes += 1
-                if 0 < self.rest_duration < self.settings.long_rest_duration:
-                    self.resting_for_minute = True
+                self.long_rest_finish = True
+            self.scheduler.cancel("rest_minute")
+            self.rest_seconds += self.rest_duration
+            self.change_to_work()
+            self.registrator(self.global_id)
+
+    def log_rest_minute(self):
+        with self.lock:
+            if self.scheduler.stopped:
+                return
+            self.total_rest_minutes += 1
+            self.resting_for_minute = True
+            self.scheduler.schedule_in("rest_minute", 60, self.log_rest_minute)
+            self.registrator(self.global_id)
+
+    def checkpoint(self, global_id):
+        """Writes the work done since the last write. Runs every
+        CHECKPOINT_INTERVAL seconds of work, so a crash loses at most one
+        interval."""
+        # Whole seconds only, the fraction is carried to the next write
+        unrecorded = int(self.activity_duration - self.recorded_duration)
+        if self.timer.working and unrecorded > 0:
+            with self.timer.write_lock:
+                write_total_activity_to_task(self.store, global_id, unrecorded, self.timer.clock.time())
+                self.store.flush()
+            self.recorded_duration += unrecorded
 
     def registrator(self, global_id):
         if self.pomodoro_finish: 
             message = f"\rPomodoro #{self.pomodoro_count} complete! Time to relax and store focus points"
             self.send_notification(message)
-            write_total_activity_to_task(self.files.data_file, global_id, self.settings)
+            with self.timer.write_lock:
+                write_total_activity_to_task(
+                    self.store,
+                    global_id,
+                    self.settings.work_duration - self.recorded_duration,
+                    self.timer.clock.time(),
+                )
+                self.store.flush()
+            self.recorded_duration = 0
             self.pomodoro_finish = False
         if self.long_rest_start:
             message = f"\rLong rest for {self.settings.long_rest_duration // 60} minutes."
@@ -104,26 +211,24 @@ class IntervalTimer:
             self.active_for_minute = False
         if self.resting_for_minute:
             print("\r" + " " * 75, end='', flush=True)  # Overwrite with spaces
-            print(f"\rResting for {self.rest_duration // 60} minute(s).", end='', flush=True)
+            print(f"\rResting for {int(self.rest_duration) // 60} minute(s).", end='', flush=True)
             self.resting_for_minute = False
 
 
     def send_notification(self, message):
         print("\r" + " " * 75, end='', flush=True)  # Overwrite with spaces
         print(message, end='', flush=True)
-        subprocess.run(['notify-send', "Pomodoro timer", message])
-        try:
-            pygame.mixer.music.load(self.notification_sound)
-            pygame.mixer.music.play()
-        except pygame.error as e:
-            print(f"Failed to play sound: {e}")
+        self.notifier.notify(message.lstrip("\r"))
 
     def change_to_rest(self):
         """Resets the timer for the next Pomodoro session."""
         self.timer.working = False
-        self.activity_timer_pause = True
-        self.activity_duration = 0
-        self.rest_duration = 0
+        self.work_elapsed = 0
+        self.rest_started_at = self.clock()
+        rest_duration = self.settings.long_rest_duration if self.long_rest else self.settings.short_rest_duration
+        self.scheduler.schedule_in("rest_end", rest_duration, self.finish_rest)
+        if 60 < rest_duration:
+            self.scheduler.schedule_in("rest_minute", 60, self.log_rest_minute)
 
     def change_to_work(self):
         """Resets the timer for the next Pomodoro session."""
@@ -133,7 +238,5 @@ class IntervalTimer:
         # Set to False if want launch activity timer immediately after rest time
         # finish, without keyboard or mouse activity checking
         self.timer.activity_timer_pause = True
-        self.activity_duration = 0
-        self.rest_duration = 0
-        self.timer.last_activity_time = time.time()
-        
+        self.work_elapsed = 0
+        self.rest_started_at = None
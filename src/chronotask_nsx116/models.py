@@ -0,0 +1,74 @@
+import time
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def to_epoch(timestamp):
+    """Local "%Y-%m-%d %H:%M:%S" timestamp to epoch seconds."""
+    return int(time.mktime(time.strptime(timestamp, TIMESTAMP_FORMAT)))
+
+
+def epoch_date(epoch):
+    return time.strftime("%Y-%m-%d", time.localtime(epoch))
+
+
+class Session:
+    """One work session of a task. Start and last stop are epoch seconds,
+    the work time is kept in whole seconds so repeated additions don't
+    drift. On disk a session is the list [started, stopped, seconds]."""
+
+    __slots__ = ("started", "stopped", "seconds")
+
+    def __init__(self, started, stopped=None, seconds=0):
+        self.started = started
+        self.stopped = stopped
+        self.seconds = seconds
+
+    @property
+    def date(self):
+        # Sessions count for the local day they started on
+        return epoch_date(self.started)
+
+    def encode(self):
+        return [self.started, self.stopped, self.seconds]
+
+    @classmethod
+    def from_legacy(cls, date, session):
+        # {"work_started_at": str, "work_stopped_at": str, "minutes": float}
+        # written before sessions were encoded as lists
+        started = session.get("work_started_at") or f"{date} 00:00:00"
+        stopped = session.get("work_stopped_at")
+        return cls(to_epoch(started), to_epoch(stopped) if stopped else None,
+                   round(session.get("minutes", 0) * 60))
+
+    def __repr__(self):
+        return f"Session({self.started}, {self.stopped}, {self.seconds})"
+
+
+def encode(value):
+    """json.dump default hook writing sessions in their compact form."""
+    if isinstance(value, Session):
+        return value.encode()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def decode_task(task):
+    """Turns a task read from disk into its in-memory form, in place.
+    Tasks written before sessions were compact carry a "history" dict of
+    sessions by date and "total_work" in minutes instead. Sessions stay
+    lists until task_sessions is called, most commands never read them."""
+    if "history" in task:
+        history = task.pop("history") or {}
+        task["sessions"] = [Session.from_legacy(date, session)
+                            for date in sorted(history) for session in history[date]]
+        task["work_seconds"] = round(task.pop("total_work", 0) * 60)
+    return task
+
+
+def task_sessions(task):
+    """The Session objects of a task, decoded from their on-disk lists on
+    first use."""
+    sessions = task.setdefault("sessions", [])
+    if sessions and not isinstance(sessions[0], Session):
+        sessions[:] = [Session(*values) for values in sessions]
+    return sessions
@@ -0,0 +1,151 @@
+import os
+import queue
+import subprocess
+import sys
+import threading
+
+NOTIFICATION_TITLE = "Pomodoro timer"
+
+
+class Sink:
+    """Somewhere a notification goes. open() runs once on the notifier
+    thread before the first notification, so slow setup such as loading a
+    sound doesn't hold up the timer."""
+
+    def open(self):
+        pass
+
+    def notify(self, title, message):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class DesktopSink(Sink):
+    """A desktop notification through notify-send."""
+
+    def __init__(self):
+        self.available = True
+
+    def notify(self, title, message):
+        if not self.available:
+            return
+        try:
+            subprocess.run(["notify-send", title, message], timeout=10)
+        except FileNotFoundError:
+            print("\rnotify-send not found, desktop notifications are off.", file=sys.stderr)
+            self.available = False
+        except (OSError, subprocess.TimeoutExpired) as e:
+            print(f"\rFailed to send a desktop notification: {e}", file=sys.stderr)
+
+
+class SoundSink(Sink):
+    """Plays a sound, decoded once into memory when the sink opens."""
+
+    def __init__(self, sound_file):
+        self.sound_file = sound_file
+        self.sound = None
+
+    def open(self):
+        os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = "hide"  # Hides Pygame's greeting message
+        import pygame  # Only the timer plays sounds
+        try:
+            pygame.mixer.init()
+            self.sound = pygame.mixer.Sound(self.sound_file)
+        except pygame.error as e:
+            print(f"\rFailed to load sound: {e}", file=sys.stderr)
+
+    def notify(self, title, message):
+        if self.sound:
+            self.sound.play()  # Mixes in the background, doesn't wait for the end
+
+
+class BellSink(Sink):
+    """The terminal bell."""
+
+    def notify(self, title, message):
+        sys.stdout.write("\a")
+        sys.stdout.flush()
+
+
+class NullSink(Sink):
+    def notify(self, title, message):
+        pass
+
+
+class RecordingSink(Sink):
+    """Keeps the notifications instead of showing them, for scripted runs."""
+
+    def __init__(self):
+        self.calls = []
+
+    def notify(self, title, message):
+        self.calls.append((title, message))
+
+
+class Notifier:
+    """Hands notifications to the sinks on a background thread. notify()
+    only puts the message on a queue, so the timer never waits for
+    notify-send or the audio device."""
+
+    def __init__(self, sinks):
+        self.sinks = sinks
+        self.queue = queue.SimpleQueue()
+        self.thread = None
+
+    def notify(self, message, title=NOTIFICATION_TITLE):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+        self.queue.put((title, message))
+
+    def run(self):
+        for sink in self.sinks:
+            sink.open()
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            for sink in self.sinks:
+                try:
+                    sink.notify(*item)
+                except Exception as e:
+                    print(f"\rNotification failed: {e}", file=sys.stderr)
+        for sink in self.sinks:
+            sink.close()
+
+    def close(self, timeout=2):
+        """Delivers what is queued and stops the thread, waiting at most
+        timeout seconds."""
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join(timeout)
+            self.thread = None
+
+
+class InlineNotifier(Notifier):
+    """Calls the sinks on the caller's thread, for simulated runs that have
+    no real time to lose and no thread to wait for."""
+
+    def notify(self, message, title=NOTIFICATION_TITLE):
+        for sink in self.sinks:
+            sink.notify(title, message)
+
+    def close(self, timeout=2):
+        pass
+
+
+NOTIFICATION_SINKS = ["desktop", "sound", "bell", "none"]
+
+
+def make_notifier(names, sound_file):
+    """A Notifier for comma separated sink names, unknown names are
+    skipped."""
+    factories = {
+        "desktop": DesktopSink,
+        "sound": lambda: SoundSink(sound_file),
+        "bell": BellSink,
+        "none": NullSink,
+    }
+    return Notifier([factories[name]() for name in names.split(",") if name in factories])
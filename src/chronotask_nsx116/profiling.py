@@ -0,0 +1,120 @@
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+
+class NoSpan:
+    """What span returns while profiling is off, costs one call."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def add_bytes(self, amount):
+        pass
+
+
+NO_SPAN = NoSpan()
+
+
+class Profiler:
+    """Timings of named phases (load_data, lookup, mutation, save_data,
+    render, plot...) and event counters, collected when a command runs
+    with --profile. Spans with the same name add up, each keeps how often
+    it ran, the seconds spent and the bytes it read or wrote."""
+
+    def __init__(self):
+        self.enabled = False
+        self.lock = threading.Lock()  # Timer threads count too
+        self.reset()
+
+    def reset(self):
+        self.spans = {}  # name -> [calls, seconds, bytes]
+        self.counters = {}
+        self.started = time.perf_counter()
+
+    def enable(self):
+        self.reset()
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def span(self, name):
+        """Context manager timing the block under name. The value it gives
+        has an add_bytes method for the bytes the block moved."""
+        if not self.enabled:
+            return NO_SPAN
+        return self.timed(name)
+
+    @contextmanager
+    def timed(self, name):
+        span = Span()
+        started = time.perf_counter()
+        try:
+            yield span
+        finally:
+            elapsed = time.perf_counter() - started
+            with self.lock:
+                totals = self.spans.setdefault(name, [0, 0.0, 0])
+                totals[0] += 1
+                totals[1] += elapsed
+                totals[2] += span.bytes
+
+    def count(self, name, amount=1):
+        if self.enabled:
+            with self.lock:
+                self.counters[name] = self.counters.get(name, 0) + amount
+
+    def to_dict(self):
+        with self.lock:
+            return {
+                "total_ms": round((time.perf_counter() - self.started) * 1000, 3),
+                "spans": {name: {"calls": calls, "ms": round(seconds * 1000, 3), "bytes": nbytes}
+                          for name, (calls, seconds, nbytes) in self.spans.items()},
+                "counters": dict(self.counters),
+            }
+
+    def summary(self):
+        report = self.to_dict()
+        lines = [f"Profile: {report['total_ms']:.1f} ms in total"]
+        for name, span in sorted(report["spans"].items(), key=lambda item: -item[1]["ms"]):
+            size = f"  {span['bytes']} bytes" if span["bytes"] else ""
+            lines.append(f"    {name:<20} {span['ms']:>10.2f} ms  {span['calls']:>6} calls{size}")
+        for name, value in report["counters"].items():
+            lines.append(f"    {name:<20} {value:>10}")
+        return "\n".join(lines)
+
+    def report(self, output=None):
+        """Prints the summary to stderr, and writes the JSON to output when
+        given."""
+        print(self.summary(), file=sys.stderr)
+        if output:
+            with open(output, 'w') as file:
+                json.dump(self.to_dict(), file, indent=4)
+
+
+class Span:
+    __slots__ = ("bytes",)
+
+    def __init__(self):
+        self.bytes = 0
+
+    def add_bytes(self, amount):
+        self.bytes += amount
+
+
+# One profiler per process, commands turn it on with --profile
+PROFILER = Profiler()
+
+
+def span(name):
+    return PROFILER.span(name)
+
+
+def count(name, amount=1):
+    PROFILER.count(name, amount)
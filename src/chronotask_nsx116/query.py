@@ -0,0 +1,157 @@
+import bisect
+from chronotask_nsx116.profiling import span
+
+# Fields with a sorted index, their keys come from sort_key
+SORTED_FIELDS = ("date", "date_added", "date_done", "value")
+
+# Fields an update has to change for the indexes to be updated
+INDEXED_FIELDS = {"project", "tag", *SORTED_FIELDS}
+
+
+def task_tags(task):
+    # "urgent,review" -> {"urgent", "review"}
+    return {tag for tag in (task.get("tag") or "").split(",") if tag}
+
+
+def hash_keys(field, task):
+    # Keys of the task in the hash index of field, a task has several tags
+    return task_tags(task) if field == "tag" else [task.get(field)]
+
+
+def sort_key(field, task):
+    """The key a task is sorted by in the index of field: the day of a
+    date field and the number of value, None when the task has none."""
+    value = task.get(field)
+    if field == "value":
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return None
+    return value[:10] if value else None
+
+
+class TaskQuery:
+    """Filters of list and id combined with and. Dates are "%Y-%m-%d" days
+    and both ends of a range are included."""
+
+    def __init__(self, project=None, tag=None, due_after=None, due_before=None, min_value=None,
+                 added_after=None, added_before=None, done_after=None, done_before=None):
+        self.project = project
+        self.tag = tag
+        # field -> (first, last) for the sorted indexes, None leaves an end open
+        self.ranges = {}
+        for field, first, last in (("date", due_after, due_before),
+                                   ("date_added", added_after, added_before),
+                                   ("date_done", done_after, done_before),
+                                   ("value", min_value, None)):
+            if first is not None or last is not None:
+                self.ranges[field] = (first, last)
+
+    def __bool__(self):
+        return self.project is not None or self.tag is not None or bool(self.ranges)
+
+    def matches(self, task):
+        if self.project is not None and task.get("project") != self.project:
+            return False
+        if self.tag is not None and self.tag not in task_tags(task):
+            return False
+        for field, (first, last) in self.ranges.items():
+            key = sort_key(field, task)
+            if key is None or (first is not None and key < first) or (last is not None and key > last):
+                return False
+        return True
+
+
+class SortedIndex:
+    """Global IDs ordered by a key, for range lookups with bisect."""
+
+    def __init__(self, pairs=()):
+        pairs = sorted(pair for pair in pairs if pair[0] is not None)
+        self.keys = [key for key, _ in pairs]
+        self.ids = [global_id for _, global_id in pairs]
+
+    def add(self, key, global_id):
+        if key is None:
+            return
+        position = bisect.bisect_right(self.keys, key)
+        self.keys.insert(position, key)
+        self.ids.insert(position, global_id)
+
+    def remove(self, key, global_id):
+        if key is None:
+            return
+        # The task is among the ones with an equal key
+        position = bisect.bisect_left(self.keys, key)
+        while self.ids[position] != global_id:
+            position += 1
+        del self.keys[position]
+        del self.ids[position]
+
+    def span(self, first, last):
+        start = 0 if first is None else bisect.bisect_left(self.keys, first)
+        end = len(self.keys) if last is None else bisect.bisect_right(self.keys, last)
+        return start, max(start, end)
+
+
+class TaskIndexes:
+    """Secondary indexes of the tasks in memory: project and tag map to
+    sets of global IDs, due, added and done days and values are kept
+    sorted. Each index is built the first time a query needs it and kept
+    up to date from then on.
+
+    The indexes live in memory only and are built for long-lived stores,
+    the daemon's, where they serve many queries. One-shot commands scan
+    the tasks, a build sorts all of them and costs more than one scan."""
+
+    def __init__(self, tasks):
+        self.tasks = tasks  # The store's task list
+        self.hashed = {}  # "project" or "tag" -> key -> set of global IDs
+        self.sorted = {}  # field -> SortedIndex
+
+    def hashed_index(self, field):
+        if field not in self.hashed:
+            with span("build_query_index"):
+                index = self.hashed[field] = {}
+                for task in self.tasks:
+                    for key in hash_keys(field, task):
+                        index.setdefault(key, set()).add(task["global_id"])
+        return self.hashed[field]
+
+    def sorted_index(self, field):
+        if field not in self.sorted:
+            with span("build_query_index"):
+                self.sorted[field] = SortedIndex((sort_key(field, task), task["global_id"])
+                                                 for task in self.tasks)
+        return self.sorted[field]
+
+    def add(self, task):
+        for field, index in self.hashed.items():
+            for key in hash_keys(field, task):
+                index.setdefault(key, set()).add(task["global_id"])
+        for field, index in self.sorted.items():
+            index.add(sort_key(field, task), task["global_id"])
+
+    def remove(self, task):
+        for field, index in self.hashed.items():
+            for key in hash_keys(field, task):
+                index.get(key, set()).discard(task["global_id"])
+        for field, index in self.sorted.items():
+            index.remove(sort_key(field, task), task["global_id"])
+
+    def plan(self, query, status_ids=None):
+        """The ways to get candidate global IDs for the query as (name,
+        size, fetch), fewest candidates first. Sizes are exact and cheap:
+        set lengths and bisect positions, fetch() returns the IDs."""
+        plans = []
+        if status_ids is not None:
+            plans.append(("status", len(status_ids), lambda: status_ids))
+        for field, value in (("project", query.project), ("tag", query.tag)):
+            if value is not None:
+                ids = self.hashed_index(field).get(value, set())
+                plans.append((field, len(ids), lambda ids=ids: ids))
+        for field, (first, last) in query.ranges.items():
+            index = self.sorted_index(field)
+            start, end = index.span(first, last)
+            plans.append((field, end - start, lambda index=index, start=start, end=end: index.ids[start:end]))
+        plans.sort(key=lambda plan: plan[1])
+        return plans
@@ -0,0 +1,97 @@
+import json
+import textwrap
+
+
+def get_checkbox(status):
+    if status == "active":
+        return "[ ]"
+    elif status == "done":
+        return "[x]"
+    elif status == "dismissed":
+        return "[-]"
+    return "[?]"  # For any unknown status
+
+
+class TableRenderer:
+    """The task table for people. Only the cells of the printed rows are
+    kept, not the tasks, and the ID and Hours columns are as wide as their
+    widest value. Listings meant for scripts stream with tsv or jsonl."""
+
+    TEXT_WIDTH = 35
+    HEADER = ['ID', '[*]', 'Text', 'Created', 'Done', 'Hours']
+
+    def __init__(self):
+        self.lines = []
+        self.count = 0
+
+    def add_row(self, current_id, task):
+        self.count += 1
+        wrapped_lines = textwrap.wrap(task["text"], width=self.TEXT_WIDTH) or [""]
+        date_added = task["date_added"].split(" ")[0]
+        done_string = task.get("date_done")
+        date_done = done_string.split(" ")[0] if done_string else "    -     "
+        total_work_hours = round(task["work_seconds"] / 3600, 1)
+        self.lines.append([str(current_id), get_checkbox(task["status"]), wrapped_lines[0],
+                           date_added, date_done, str(total_work_hours)])
+        for line in wrapped_lines[1:]:
+            self.lines.append(["", "", line, "", "", ""])
+
+    def finish(self):
+        if not self.count:
+            return
+        widths = [max(len(cell) for cell in column) for column in zip(self.HEADER, *self.lines)]
+        widths[2] = self.TEXT_WIDTH
+        border = "+" + "+".join("-" * (width + 2) for width in widths) + "+"
+
+        def print_line(cells):
+            print("|" + "|".join(f" {cell.ljust(width)} " for cell, width in zip(cells, widths)) + "|")
+
+        print(border)
+        print_line(self.HEADER)
+        print(border)
+        for cells in self.lines:
+            print_line(cells)
+        print(border)
+
+
+class TsvRenderer:
+    """Tab separated rows for scripts, one task per line."""
+
+    COLUMNS = ["id", "status", "text", "date", "project", "tag", "value",
+               "date_added", "date_done", "work_seconds", "global_id"]
+
+    def __init__(self):
+        self.count = 0
+
+    def add_row(self, current_id, task):
+        if self.count == 0:
+            print("\t".join(self.COLUMNS))
+        self.count += 1
+        values = [current_id] + [task.get(column) for column in self.COLUMNS[1:]]
+        print("\t".join("" if value is None else " ".join(str(value).split()) for value in values))
+
+    def finish(self):
+        pass
+
+
+class JsonlRenderer:
+    """One JSON object per task and line, without the sessions."""
+
+    def __init__(self):
+        self.count = 0
+
+    def add_row(self, current_id, task):
+        self.count += 1
+        row = {"id": current_id}
+        row.update((key, value) for key, value in task.items() if key != "sessions")
+        print(json.dumps(row))
+
+    def finish(self):
+        pass
+
+
+RENDERERS = {
+    "table": TableRenderer,
+    "tsv": TsvRenderer,
+    "jsonl": JsonlRenderer,
+}
@@ -0,0 +1,82 @@
+import heapq
+import itertools
+import threading
+import time
+from chronotask_nsx116.profiling import count
+
+
+class Scheduler:
+    """Runs callbacks at deadlines on a monotonic clock.
+
+    Upcoming events sit in a heap and the loop sleeps on a threading.Event
+    until the earliest deadline, so nothing wakes up between events.
+    Scheduling an event under a name replaces the pending one with that
+    name. wait(timeout) replaces the sleep, a simulated clock passes one
+    that moves its time forward instead."""
+
+    def __init__(self, clock=time.monotonic, wait=None):
+        self.clock = clock
+        self.heap = []
+        self.counter = itertools.count()
+        self.pending = {}  # name -> sequence number of its live heap entry
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.wait = wait or self.wakeup.wait
+        self.stopped = False
+
+    def schedule(self, name, deadline, callback):
+        with self.lock:
+            seq = next(self.counter)
+            self.pending[name] = seq
+            heapq.heappush(self.heap, (deadline, seq, name, callback))
+        self.wakeup.set()
+
+    def schedule_in(self, name, delay, callback):
+        self.schedule(name, self.clock() + delay, callback)
+
+    def cancel(self, name):
+        with self.lock:
+            self.pending.pop(name, None)
+
+    def stop(self):
+        # Drops every scheduled event. One already taken by run may still
+        # be running, callbacks check stopped under their own lock
+        with self.lock:
+            self.stopped = True
+            self.pending.clear()
+            self.heap.clear()
+        self.wakeup.set()
+
+    def pop_due(self):
+        """Returns the callback of the earliest due event, or None and the
+        seconds until the next deadline (None if nothing is scheduled)."""
+        with self.lock:
+            # Entries cancelled or replaced since they were pushed are dropped
+            while self.heap and self.pending.get(self.heap[0][2]) != self.heap[0][1]:
+                heapq.heappop(self.heap)
+            if not self.heap:
+                return None, None
+            deadline, seq, name, callback = self.heap[0]
+            timeout = deadline - self.clock()
+            if timeout > 0:
+                return None, timeout
+            heapq.heappop(self.heap)
+            del self.pending[name]
+            return callback, 0
+
+    def run(self, until=None):
+        """Runs the events until stop() is called, or until the clock
+        reaches until when given."""
+        while not self.stopped:
+            self.wakeup.clear()
+            callback, timeout = self.pop_due()
+            if callback:
+                count("timer_events")
+                callback()
+                continue
+            if until is not None:
+                remaining = until - self.clock()
+                if remaining <= 0:
+                    return
+                timeout = remaining if timeout is None else min(timeout, remaining)
+            self.wait(timeout)
@@ -0,0 +1,232 @@
+import bisect
+import json
+import math
+import os
+import re
+from chronotask_nsx116.profiling import span
+
+# Weight of a word by the field it is in, the keys are SEARCH_FIELDS
+FIELD_WEIGHTS = {"text": 1, "project": 2, "tag": 2}
+
+# Journal size in bytes after which the next search folds it into the index
+INDEX_COMPACT_SIZE = 256 * 1024
+
+WORD = re.compile(r"\w+")
+
+
+def tokenize(value):
+    return WORD.findall(str(value).lower()) if value else []
+
+
+def task_words(task):
+    """word -> weight for the words of the task's searchable fields."""
+    words = {}
+    for field, weight in FIELD_WEIGHTS.items():
+        for word in tokenize(task.get(field)):
+            words[word] = words.get(word, 0) + weight
+    return words
+
+
+class SearchIndex:
+    """Inverted index from the words of task text, project and tag to the
+    tasks holding them, kept in search_index.json.
+
+    Commands that add, delete or edit tasks append the change to
+    search_index.journal, which the next search folds in. Every change
+    records the store's search generation before and after it. If the
+    changes don't lead from the index to the store's current generation,
+    the tasks were changed without the index seeing it, and the index is
+    rebuilt from the store. So is an index made for another store, a
+    migrated store counts its generations from 0 again."""
+
+    def __init__(self, index_file):
+        self.index_file = index_file
+        self.journal_file = os.path.splitext(index_file)[0] + ".journal"
+        self.postings = {}  # word -> {global_id: weight}
+        self.documents = 0
+        self.generation = None  # None until read
+        self.store_id = None  # Store the index was built from
+        self.journal_offset = 0  # Journal bytes applied to the index
+        self.words = None  # Sorted vocabulary for prefix lookups, made on demand
+
+    def record(self, before, after, removed=(), added=()):
+        """Appends a change that took the store from search generation
+        before to after, removing the words of the removed tasks (as they
+        were before the change) and adding the ones of the added tasks."""
+        if before == after:
+            return  # No searchable field changed
+        record = {"before": before, "after": after,
+                  "removed": {task["global_id"]: list(task_words(task)) for task in removed},
+                  "added": {task["global_id"]: task_words(task) for task in added}}
+        # One write of one line, appends of other processes don't interleave
+        with open(self.journal_file, 'a') as file:
+            file.write(json.dumps(record) + "\n")
+
+    def load(self, store):
+        """Brings the index up to date with the store: reads it with its
+        journal, rebuilds it if it doesn't match the store and writes it
+        out again when rebuilt or when the journal has grown."""
+        with span("load_index") as timing:
+            # An index kept in memory (the daemon's) only reads new records
+            if self.generation is None or not self.read_journal(timing):
+                if self.read_index(timing):
+                    self.read_journal(timing)
+        if self.store_id != store.store_id() or self.generation != store.search_generation():
+            with span("build_index"):
+                self.build(store)
+            self.save()
+        elif self.journal_offset > INDEX_COMPACT_SIZE:
+            self.save()
+
+    def read_index(self, timing):
+        self.generation = None
+        self.words = None
+        self.journal_offset = 0
+        try:
+            with open(self.index_file, 'rb') as file:
+                contents = file.read()
+            index = json.loads(contents)
+            self.postings = index["postings"]
+            self.documents = index["documents"]
+            self.generation = index["generation"]
+            self.store_id = index.get("store_id")
+        except (OSError, ValueError, KeyError):
+            return False
+        timing.add_bytes(len(contents))
+        return True
+
+    def read_journal(self, timing):
+        # Applies the records appended since the last read. False when the
+        # index has to be read again: the journal was folded in by another
+        # process or its records don't chain from the index
+        try:
+            with open(self.journal_file, 'rb') as file:
+                file.seek(0, os.SEEK_END)
+                if file.tell() < self.journal_offset:
+                    return False
+                file.seek(self.journal_offset)
+                journal = file.read()
+        except FileNotFoundError:
+            return self.journal_offset == 0
+        # A last line without its newline is still being written
+        journal = journal[:journal.rfind(b"\n") + 1]
+        timing.add_bytes(len(journal))
+        self.journal_offset += len(journal)
+        for line in journal.splitlines():
+            try:
+                record = json.loads(line)
+            except ValueError:
+                self.generation = None
+                return False
+            if record["after"] <= self.generation:
+                continue  # Already folded into the index
+            if record["before"] != self.generation:
+                self.generation = None
+                return False
+            self.apply(record)
+        return True
+
+    def apply(self, record):
+        for global_id, words in record["removed"].items():
+            for word in words:
+                tasks = self.postings.get(word)
+                if tasks and tasks.pop(global_id, None) is not None and not tasks:
+                    del self.postings[word]
+            self.documents -= 1
+        for global_id, words in record["added"].items():
+            for word, weight in words.items():
+                self.postings.setdefault(word, {})[global_id] = weight
+            self.documents += 1
+        self.generation = record["after"]
+        self.words = None
+
+    def build(self, store):
+        # Read first, a change made while the tasks are read only makes
+        # the next search rebuild again
+        self.generation = store.search_generation()
+        self.store_id = store.store_id()
+        self.postings = {}
+        self.documents = 0
+        self.words = None
+        for task in store.iter_tasks():
+            for word, weight in task_words(task).items():
+                self.postings.setdefault(word, {})[task["global_id"]] = weight
+            self.documents += 1
+
+    def save(self):
+        index = {"store_id": self.store_id, "generation": self.generation, "documents": self.documents,
+                 "postings": self.postings}
+        tmp_file = self.index_file + ".tmp"
+        try:
+            with span("save_index") as timing, open(tmp_file, 'w') as file:
+                timing.add_bytes(file.write(json.dumps(index)))
+            os.replace(tmp_file, self.index_file)
+            # The journal is folded in, records appended since then chain
+            # from an older generation and force a rebuild
+            open(self.journal_file, 'w').close()
+            self.journal_offset = 0
+        except OSError as e:
+            print(f"Failed to write the search index: {e}")
+
+    def matches(self, term):
+        # (word, its postings) for the words starting with term
+        if self.words is None:
+            self.words = sorted(self.postings)
+        index = bisect.bisect_left(self.words, term)
+        matches = []
+        while index < len(self.words) and self.words[index].startswith(term):
+            matches.append((self.words[index], self.postings[self.words[index]]))
+            index += 1
+        return matches
+
+    def scores(self, query):
+        """global_id -> score of the tasks holding every word of the query.
+        A query word matches the words starting with it, whole words score
+        twice as much, and rare words more than common ones."""
+        terms = [(term, self.matches(term)) for term in tokenize(query)]
+        # The term with the fewest tasks goes first, the others only score
+        # the tasks still in the running
+        terms.sort(key=lambda item: sum(len(tasks) for _, tasks in item[1]))
+        scores = None
+        for term, matches in terms:
+            term_scores = {}
+            for word, tasks in matches:
+                rarity = math.log(1 + self.documents / len(tasks))
+                if word != term:
+                    rarity /= 2
+                if scores is not None and len(scores) < len(tasks):
+                    pairs = ((global_id, tasks.get(global_id)) for global_id in scores)
+                else:
+                    pairs = tasks.items()
+                for global_id, weight in pairs:
+                    if weight is None or (scores is not None and global_id not in scores):
+                        continue
+                    score = weight * rarity
+                    if score > term_scores.get(global_id, 0):
+                        term_scores[global_id] = score
+            if scores is None:
+                scores = term_scores
+            else:
+                scores = {global_id: score + term_scores[global_id]
+                          for global_id, score in scores.items() if global_id in term_scores}
+            if not scores:
+                break
+        return scores or {}
+
+    def search(self, store, query, statuses=None, limit=None):
+        """The tasks matching the query, best first, only the ones with a
+        status from statuses when given."""
+        self.load(store)
+        with span("search"):
+            scores = self.scores(query)
+            ranked = sorted(scores, key=lambda global_id: (-scores[global_id], global_id))
+        results = []
+        with span("lookup"):
+            # Tasks are only read until the limit is reached
+            for global_id in ranked:
+                task = store.get_task(global_id)
+                if task and (statuses is None or task["status"] in statuses):
+                    results.append(task)
+                    if limit and len(results) >= limit:
+                        break
+        return results
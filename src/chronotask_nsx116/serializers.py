@@ -0,0 +1,59 @@
+import json
+
+try:
+    import orjson  # Optional, several times faster than the json module
+except ImportError:
+    orjson = None
+
+from chronotask_nsx116.models import encode
+
+
+class Codec:
+    """Turns the data document into bytes and back. Every codec writes
+    JSON, so any of them reads a file written by another."""
+
+    name = None
+
+    def dumps(self, data):
+        raise NotImplementedError
+
+    def loads(self, contents):
+        if orjson:
+            return orjson.loads(contents)
+        return json.loads(contents)
+
+
+class CompactCodec(Codec):
+    """JSON without indentation or spaces, what data.json, the journal and
+    the archive are written in."""
+
+    name = "compact"
+
+    def dumps(self, data):
+        if orjson:
+            return orjson.dumps(data, default=encode)
+        return json.dumps(data, separators=(",", ":"), default=encode).encode()
+
+
+class PrettyCodec(Codec):
+    """Indented JSON for people reading the file, the layout data.json had
+    before codecs existed."""
+
+    name = "pretty"
+
+    def dumps(self, data):
+        # orjson only indents by two spaces, this keeps the old layout
+        return json.dumps(data, indent=4, default=encode).encode()
+
+
+CODECS = {codec.name: codec for codec in (CompactCodec(), PrettyCodec())}
+
+
+def get_codec(name):
+    return CODECS.get(name, CODECS["compact"])
+
+
+def detect_codec(contents):
+    """The codec an existing file was written with. Pretty files break the
+    line right after the opening brace."""
+    return CODECS["pretty"] if contents[1:2] in (b"\n", b"\r") else CODECS["compact"]
@@ -3,12 +3,17 @@ import os
 
 class Settings:
     def __init__(self, work_duration=25 * 60, short_rest_duration=5 * 60, long_rest_duration=15 * 60, 
-                 pomodoros_before_long_rest=4, inactivity_limit=90):
+                 pomodoros_before_long_rest=4, inactivity_limit=90, archive_after_days=30,
+                 activity_source="input", data_format="compact", notifications="desktop,sound"):
         self.work_duration = work_duration        
         self.short_rest_duration = short_rest_duration        
         self.long_rest_duration = long_rest_duration        
         self.pomodoros_before_long_rest = pomodoros_before_long_rest        
         self.inactivity_limit = inactivity_limit  
+        self.archive_after_days = archive_after_days
+        self.activity_source = activity_source  # "input" listeners or "idle" counter polling
+        self.data_format = data_format  # Codec data.json is written with, "compact" or "pretty"
+        self.notifications = notifications  # Comma separated sinks, see NOTIFICATION_SINKS
 
     @classmethod
     def from_dict(cls, data):
@@ -18,6 +23,10 @@ class Settings:
             long_rest_duration = data.get("long_rest_duration", 15 * 60), 
             pomodoros_before_long_rest = data.get("pomodoros_before_long_rest", 4),  
             inactivity_limit = data.get("inactivity_limit", 90),  
+            archive_after_days = data.get("archive_after_days", 30),
+            activity_source = data.get("activity_source", "input"),
+            data_format = data.get("data_format", "compact"),
+            notifications = data.get("notifications", "desktop,sound"),
             )
 
     def to_dict(self):
@@ -27,6 +36,10 @@ class Settings:
                 "long_rest_duration": self.long_rest_duration, 
                 "pomodoros_before_long_rest": self.pomodoros_before_long_rest,
                 "inactivity_limit": self.inactivity_limit, 
+                "archive_after_days": self.archive_after_days,
+                "activity_source": self.activity_source,
+                "data_format": self.data_format,
+                "notifications": self.notifications,
                 }
 
 
@@ -35,7 +48,19 @@ class Files:
         self.app_name = "chronotask_nsx116"
         self.data_file_short = "data.json"
         self.pomodoro_summary_short = "pomodoro_summary.txt"
+        self.sqlite_file_short = "data.sqlite3"
+        self.archive_dir_short = "archive"
+        self.socket_file_short = "daemon.sock"
+        self.stats_cache_file_short = "stats_cache.json"
+        self.ids_file_short = "ids.json"
+        self.search_index_file_short = "search_index.json"
 
         self.data_dir = user_data_dir(self.app_name)
         self.data_file = os.path.join(self.data_dir, self.data_file_short)
         self.pomodoro_summary_file = os.path.join(self.data_dir, self.pomodoro_summary_short)
+        self.sqlite_file = os.path.join(self.data_dir, self.sqlite_file_short)
+        self.archive_dir = os.path.join(self.data_dir, self.archive_dir_short)
+        self.socket_file = os.path.join(self.data_dir, self.socket_file_short)
+        self.stats_cache_file = os.path.join(self.data_dir, self.stats_cache_file_short)
+        self.ids_file = os.path.join(self.data_dir, self.ids_file_short)
+        self.search_index_file = os.path.join(self.data_dir, self.search_index_file_short)
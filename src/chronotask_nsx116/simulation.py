@@ -0,0 +1,82 @@
+import contextlib
+import io
+import threading
+from chronotask_nsx116.activity import ScriptedSource
+from chronotask_nsx116.clock import SimulatedClock
+from chronotask_nsx116.focustrack import FocusTrack
+from chronotask_nsx116.notifications import InlineNotifier, RecordingSink
+from chronotask_nsx116.settings import Settings
+
+DAY = 24 * 3600
+
+
+class SimulationHost:
+    """The parts of TaskManager FocusTrack uses, around a store opened by
+    the caller."""
+
+    def __init__(self, store, settings):
+        self.store = store
+        self.settings = settings
+        self.write_lock = threading.RLock()
+        self.sorted_ids = {}
+
+
+def workday_timeline(hours=8, every=30, lunch_at=4, lunch_minutes=45):
+    """Activity offsets in seconds: an event every `every` seconds for
+    `hours` hours, with no activity for lunch_minutes after lunch_at hours
+    so the inactivity pause is exercised too."""
+    lunch_start = lunch_at * 3600
+    lunch_end = lunch_start + lunch_minutes * 60
+    return [offset for offset in range(every, hours * 3600, every)
+            if not lunch_start <= offset < lunch_end]
+
+
+def run_session(store, global_id, timeline, duration, settings, clock):
+    """Runs one session of the task through FocusTrack on the simulated
+    clock: starts it, replays the timeline for duration seconds and stops
+    it. Returns the timer's figures for the session. Its duration is
+    split into work, rest and idle seconds, idle being the time paused
+    for inactivity or waiting for activity after a rest."""
+    host = SimulationHost(store, settings)
+    sink = RecordingSink()
+    timer = FocusTrack(host, activity_source=ScriptedSource(timeline, clock.monotonic), clock=clock)
+    timer.interval_timer.notifier = InlineNotifier([sink])
+    # The timer reports its progress with prints, none of it is wanted here
+    with contextlib.redirect_stdout(io.StringIO()):
+        timer.begin(global_id)
+        timer.interval_timer.run(global_id, until=clock.monotonic() + duration)
+        unfinished = timer.interval_timer.activity_duration
+        resting = timer.interval_timer.rest_duration
+        timer.stop()
+    interval_timer = timer.interval_timer
+    work_seconds = interval_timer.pomodoro_count * settings.work_duration + unfinished
+    rest_seconds = interval_timer.rest_seconds + resting
+    return {
+        "pomodoros": interval_timer.pomodoro_count,
+        "work_minutes": interval_timer.total_work_minutes,
+        "rest_minutes": interval_timer.total_rest_minutes,
+        # What the session should have written: whole pomodoros plus the
+        # work of the pomodoro running at the stop
+        "expected_seconds": round(work_seconds),
+        "work_seconds": work_seconds,
+        "rest_seconds": rest_seconds,
+        "idle_seconds": duration - work_seconds - rest_seconds,
+        "notifications": len(sink.calls),
+        "activity_events": timer.activity_source.events_seen,
+    }
+
+
+def simulate_days(store, global_id, days, timeline, settings=None, epoch=None):
+    """Runs a session of the task every day for days days, each starting at
+    the same time of day as epoch and lasting until the last activity of
+    the timeline plus the inactivity limit. Returns the figures of every
+    session."""
+    settings = settings or Settings()
+    clock = SimulatedClock(epoch)
+    duration = (max(timeline) if timeline else 0) + settings.inactivity_limit
+    results = []
+    for day in range(days):
+        # Overnight nothing runs, the clock jumps to the next morning
+        clock.elapsed = day * DAY
+        results.append(run_session(store, global_id, timeline, duration, settings, clock))
+    return results
@@ -1,9 +1,10 @@
 import plotext as plt
 from datetime import datetime
 import calendar
+from chronotask_nsx116.profiling import span
 
 
-def make_minutes_by_date_plot(year, month, data):
+def make_minutes_by_date_plot(year, month, store):
     # Prepare all dates in the specified month
     num_days = calendar.monthrange(year, month)[1]
     dates = [
@@ -14,25 +15,19 @@ def make_minutes_by_date_plot(year, month, data):
     weekdays = ["mo", "tu", "we", "th", "fr", "sa", "su"]
 
     x_labels = [
-        f"{date.split('-')[-1]}{weekdays[calendar.weekday(year, month, int(date.split('-')[-1]))]}"
-        for date in dates
+        f"{day:02d}{weekdays[calendar.weekday(year, month, day)]}"
+        for day in range(1, num_days + 1)
     ]
 
-    # Initialize a dictionary to store total minutes per date
-    minutes_by_date = {date: 0 for date in dates}
+    # Only the requested month is read from the store, in work seconds
+    with span("lookup"):
+        month_seconds = store.seconds_by_date(dates[0], dates[-1])
 
     # Flag to check if the requested year and month exist in data
-    data_has_year_month = False
+    data_has_year_month = bool(month_seconds)
 
-    # Accumulate minutes from task histories
-    for task in data.get("tasks", []):
-        for date, sessions in task.get("history", {}).items():
-            task_year, task_month, _ = map(int, date.split("-"))
-            if task_year == year and task_month == month:
-                data_has_year_month = True  # Mark that data exists for the requested month
-                if date in minutes_by_date:
-                    # Sum up all minutes for the date
-                    minutes_by_date[date] += sum(session.get("minutes", 0) for session in sessions)
+    # Initialize a dictionary to store total minutes per date
+    minutes_by_date = {date: month_seconds.get(date, 0) / 60 for date in dates}
 
     # Calculate the average using for given month
     total = sum(minutes_by_date.values())
@@ -73,5 +68,6 @@ def make_minutes_by_date_plot(year, month, data):
     for idx, label in enumerate(x_labels):
         if "mo" in label:
             plt.vline(idx, color=13)  # Use the index as the x-position
-    plt.show()
+    with span("plot"):
+        plt.show()
     print(f"Sum: {round(total / 60, 1)} hours Count: {count} days Average: {average} hours/day")
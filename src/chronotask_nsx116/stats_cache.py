@@ -0,0 +1,49 @@
+import json
+import os
+from collections import OrderedDict
+
+# Entries kept in stats_cache.json, the least recently used go first
+CACHE_ENTRIES = 64
+
+
+class StatsCache:
+    """Computed stats kept between runs in the data directory. An entry is
+    used while the store and its stats generation are unchanged. Logging
+    work bumps the generation like any other change to sessions, so a
+    breakdown is recomputed once per change rather than once per run.
+    The file is only written when an entry is added."""
+
+    def __init__(self, cache_file, max_entries=CACHE_ENTRIES):
+        self.cache_file = cache_file
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        try:
+            with open(cache_file) as file:
+                self.entries.update(json.load(file))
+        except (FileNotFoundError, ValueError):
+            pass  # No cache yet, or one cut short, start empty
+
+    def get(self, store, key, compute):
+        """The cached value of key, compute() when it is missing or stale."""
+        generation = [store.store_id(), store.stats_generation()]
+        entry = self.entries.get(key)
+        if entry and entry["generation"] == generation:
+            # Recently used in memory only, a hit never writes the file
+            self.entries.move_to_end(key)
+            return entry["value"]
+        value = compute()
+        self.entries[key] = {"generation": generation, "value": value}
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        self.save()
+        return value
+
+    def save(self):
+        tmp_file = self.cache_file + ".tmp"
+        try:
+            with open(tmp_file, 'w') as file:
+                json.dump(self.entries, file)
+            os.replace(tmp_file, self.cache_file)
+        except OSError as e:
+            print(f"Could not write the stats cache: {e}")
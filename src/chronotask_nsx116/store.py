@@ -0,0 +1,827 @@
+import itertools
+import json
+import os
+import uuid
+from contextlib import contextmanager
+from datetime import date, timedelta
+from chronotask_nsx116.archive import Archive, is_archivable
+from chronotask_nsx116.settings import Settings, Files
+from chronotask_nsx116.writing_to_task import load_data, save_data, write_to_journal, apply_record, drop_deleted_tasks
+from chronotask_nsx116.writing_to_task import build_rollup
+from chronotask_nsx116.models import Session, task_sessions, to_epoch
+from chronotask_nsx116.serializers import get_codec
+from chronotask_nsx116.writing_to_task import lock_data, journal_state, reset_journal, JOURNAL_COMPACT_SIZE
+from chronotask_nsx116.writing_to_task import STATS_FIELDS, SEARCH_FIELDS
+from chronotask_nsx116.profiling import count, span
+from chronotask_nsx116.query import INDEXED_FIELDS, TaskIndexes
+
+
+def date_bounds(first_date, last_date):
+    """Epoch seconds of local midnight starting first_date and ending
+    last_date."""
+    day_after = (date.fromisoformat(last_date) + timedelta(days=1)).strftime("%Y-%m-%d")
+    return to_epoch(f"{first_date} 00:00:00"), to_epoch(f"{day_after} 00:00:00")
+
+
+class Store:
+    """Interface TaskManager and the session writers use to reach the data.
+
+    Task dicts returned by a store are only guaranteed to carry the task
+    fields and work_seconds, sessions are read with get_sessions or summed
+    with seconds_by_date."""
+
+    # Set while a timer session runs, commits are then buffered until flush
+    batching = False
+
+    # Set by the daemon, whose store serves many commands: work done once
+    # to answer later reads faster, like query indexes, then pays off
+    long_lived = False
+
+    # Reads
+    def get_settings(self):
+        raise NotImplementedError
+
+    def get_sorted_ids(self):
+        raise NotImplementedError
+
+    def count_tasks(self):
+        raise NotImplementedError
+
+    def has_archive(self):
+        return False
+
+    def get_task(self, global_id):
+        raise NotImplementedError
+
+    def get_sessions(self, global_id):
+        """Returns the Session objects of a task, oldest first."""
+        raise NotImplementedError
+
+    def iter_tasks(self, statuses=None):
+        """Yields tasks from the most recent to the oldest, optionally only
+        the ones with a status from statuses."""
+        raise NotImplementedError
+
+    def query_tasks(self, statuses, query):
+        """Yields the tasks of iter_tasks(statuses) that match the
+        TaskQuery, in the same order."""
+        return (task for task in self.iter_tasks(statuses) if query.matches(task))
+
+    def iter_sessions(self, first_date, last_date):
+        """Yields (task, session) for the sessions started between
+        first_date and last_date (inclusive, "%Y-%m-%d"), archived tasks
+        included."""
+        raise NotImplementedError
+
+    def stats_generation(self):
+        """A number that changes whenever stats may change: a session
+        started or given work, tasks with sessions added or deleted, a
+        text, project or tag edited."""
+        raise NotImplementedError
+
+    def search_generation(self):
+        """A number that changes whenever a task is added or deleted or its
+        searchable fields are edited, see SearchIndex."""
+        raise NotImplementedError
+
+    def store_id(self):
+        """A random ID given to the store when it is created. Generations
+        count from 0 again in a new store, as after migrate, so whatever is
+        kept by generation is kept by store ID too."""
+        raise NotImplementedError
+
+    def seconds_by_date(self, first_date, last_date):
+        """Returns {date: work seconds} for the dates between first_date and
+        last_date (inclusive, "%Y-%m-%d") which have work sessions. Read
+        from the rollup, so the cost doesn't grow with the whole history."""
+        raise NotImplementedError
+
+    # Writes
+    def add_task(self, task):
+        raise NotImplementedError
+
+    def add_tasks(self, tasks):
+        """Adds many tasks with a single write where the store allows it."""
+        for task in tasks:
+            self.add_task(task)
+
+    def update_task(self, global_id, fields):
+        raise NotImplementedError
+
+    def delete_task(self, global_id):
+        raise NotImplementedError
+
+    def update_tasks(self, global_ids, fields):
+        """Sets the same fields on many tasks with a single write where the
+        store allows it."""
+        for global_id in global_ids:
+            self.update_task(global_id, fields)
+
+    def delete_tasks(self, global_ids):
+        """Deletes many tasks, returns the global IDs that were found."""
+        return [global_id for global_id in global_ids if self.delete_task(global_id)]
+
+    def save_settings(self, settings):
+        raise NotImplementedError
+
+    def start_session(self, global_id, session):
+        raise NotImplementedError
+
+    def add_work(self, global_id, seconds, stopped):
+        """Adds work seconds to the task total and to its last session,
+        which is marked stopped at the stopped epoch time. Returns False if
+        the task has no session to add them to."""
+        raise NotImplementedError
+
+    def rebuild_rollup(self):
+        """Regenerates the daily seconds rollup from the raw sessions."""
+        raise NotImplementedError
+
+    def archive_tasks(self, age_days):
+        """Moves tasks done or dismissed more than age_days ago out of the
+        hot store, returns how many were moved. Stores indexing status
+        don't need an archive."""
+        return 0
+
+    def flush(self):
+        """Writes the commits buffered while batching."""
+        pass
+
+    def refresh(self):
+        """Picks up writes made by other processes since the store was read."""
+        pass
+
+
+class JsonStore(Store):
+    """data.json loaded into memory, every mutation is appended to the
+    journal as a record that apply_record replays on the next load.
+
+    Tasks are indexed by global_id and by status so lookups don't scan
+    the task list. Old done and dismissed tasks live in monthly archive
+    segments next to data.json and are read only when asked for.
+
+    Several processes can share the files: writes take lock_data and first
+    reload if another process wrote since this one last read, so records
+    are appended to the current journal and snapshots never drop records
+    they haven't seen."""
+
+    def __init__(self, data_file, archive_dir):
+        self.data_file = data_file
+        self.archive = Archive(archive_dir)
+        self.pending = []  # Records applied in memory but not written yet
+        self.load()
+        if "rollup" not in self.data or "store_id" not in self.data:
+            self.upgrade()
+
+    def load(self):
+        # Another process may have archived or restored tasks since the
+        # archive was last read
+        self.archive.reset()
+        self.data, self.journal_offset, self.file_codec = load_data(self.data_file)
+        self.generation = self.data.get("generation", 0)
+        self.tasks = self.data.setdefault("tasks", [])
+        self.build_index()
+
+    def sync(self):
+        """Reloads the files if another process wrote to them since they
+        were read, and applies the pending records again on top. Runs under
+        lock_data."""
+        generation, size = journal_state(self.data_file)
+        if size == self.journal_offset and (not size or generation == self.generation):
+            return
+        self.load()
+        if self.journal_offset is None:
+            # Journal of an older snapshot left by a crash, already folded in
+            self.journal_offset = reset_journal(self.data_file, self.generation)
+        for record in self.pending:
+            self.apply(record)
+
+    def refresh(self):
+        with lock_data(self.data_file):
+            self.sync()
+
+    def build_index(self):
+        self.tasks_by_id = {}
+        self.ids_by_status = {}
+        self.order = {}  # global_id -> position used to list recents first
+        # Positions only grow, deleted tasks leave gaps rather than
+        # handing their position to the next task added
+        self.positions = itertools.count()
+        self.task_indexes = None  # Built by the first query that filters
+        for task in self.tasks:
+            self.index_task(task)
+
+    def index_task(self, task):
+        global_id = task["global_id"]
+        self.tasks_by_id[global_id] = task
+        self.ids_by_status.setdefault(task["status"], set()).add(global_id)
+        self.order[global_id] = next(self.positions)
+
+    def drop_deleted(self):
+        # Deleted tasks stay in the list until it is read, a batch of
+        # deletes is taken out in one pass
+        if len(self.tasks) > len(self.tasks_by_id):
+            drop_deleted_tasks(self.tasks, self.tasks_by_id)
+
+    def unindex_task(self, task):
+        global_id = task["global_id"]
+        del self.tasks_by_id[global_id]
+        self.ids_by_status[task["status"]].discard(global_id)
+        del self.order[global_id]
+        if self.task_indexes:
+            self.task_indexes.remove(task)
+
+    def upgrade(self):
+        # New stores and data.json of the first version get their ID and
+        # rollup in a first snapshot
+        with lock_data(self.data_file):
+            self.sync()
+            if "rollup" not in self.data:
+                self.data["rollup"] = build_rollup(self.iter_tasks())
+            self.data.setdefault("store_id", uuid.uuid4().hex)
+            self.save_snapshot()
+
+    def restore_task(self, global_id):
+        # Archived tasks are moved back to the hot store before a mutation.
+        # The add record reaches the disk before the segment drops the task,
+        # a crash in between leaves a copy that the hot store shadows
+        if global_id in self.tasks_by_id:
+            return
+        with lock_data(self.data_file):
+            self.sync()
+            task = None if global_id in self.tasks_by_id else self.archive.find(global_id)
+            if not task:
+                return
+            # Archived tasks are searched and counted in stats already
+            record = {"op": "add", "task": task, "restored": True}
+            self.apply(record)
+            self.pending.append(record)
+            # Records batched so far go first, in the order they were made
+            self.journal_offset = write_to_journal(self.data_file, self.pending, self.generation,
+                                                   durable=True)
+            self.pending = []
+            self.archive.remove(global_id)
+
+    def apply(self, record):
+        with span("mutation"):
+            task = self.tasks_by_id.get(record.get("global_id"))
+            old_status = task["status"] if task else None
+            # Secondary indexes drop the task as it was and add it back after
+            reindex = self.task_indexes is not None and task is not None and (
+                record["op"] == "delete"
+                or record["op"] == "update" and INDEXED_FIELDS & record["fields"].keys())
+            if reindex:
+                self.task_indexes.remove(task)
+            apply_record(self.data, record, self.tasks_by_id)
+            if reindex and record["op"] == "update":
+                self.task_indexes.add(task)
+            if record["op"] == "add":
+                self.index_task(record["task"])
+                if self.task_indexes is not None:
+                    self.task_indexes.add(record["task"])
+            elif record["op"] == "delete" and task:
+                self.ids_by_status[old_status].discard(task["global_id"])
+                del self.order[task["global_id"]]
+            elif task and task["status"] != old_status:
+                self.ids_by_status[old_status].discard(task["global_id"])
+                self.ids_by_status.setdefault(task["status"], set()).add(task["global_id"])
+
+    @contextmanager
+    def batch(self):
+        """Buffers the commits made inside the block and writes them with
+        one journal append, or one snapshot when the journal grows too big."""
+        batching = self.batching
+        self.batching = True
+        try:
+            yield
+        finally:
+            self.batching = batching
+            if not batching:
+                self.flush()
+
+    def commit(self, record):
+        self.apply(record)
+        self.pending.append(record)
+        if not self.batching:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        with lock_data(self.data_file):
+            self.sync()
+            self.journal_offset = write_to_journal(self.data_file, self.pending, self.generation)
+            self.pending = []
+            if self.journal_offset > JOURNAL_COMPACT_SIZE:
+                self.compact()
+
+    def save_snapshot(self):
+        # Runs under lock_data after sync, pending records are included
+        self.drop_deleted()
+        codec = get_codec(Settings.from_dict(self.get_settings()).data_format)
+        self.journal_offset = save_data(self.data_file, self.data, codec)
+        self.file_codec = codec
+        self.generation = self.data["generation"]
+        self.pending = []
+
+    def compact(self):
+        """Folds the journal into a new snapshot, moving old done and
+        dismissed tasks to the archive on the way."""
+        with lock_data(self.data_file):
+            self.sync()
+            settings = Settings.from_dict(self.get_settings())
+            self.move_to_archive(settings.archive_after_days)
+            self.save_snapshot()
+
+    def move_to_archive(self, age_days):
+        self.drop_deleted()
+        old_tasks = [task for task in self.tasks if is_archivable(task, age_days)]
+        if not old_tasks:
+            return 0
+        # Segments are written first, a crash before the snapshot only
+        # leaves copies that the hot store shadows
+        self.archive.add(old_tasks)
+        for task in old_tasks:
+            self.unindex_task(task)
+        self.tasks[:] = [task for task in self.tasks if task["global_id"] in self.tasks_by_id]
+        return len(old_tasks)
+
+    def archive_tasks(self, age_days):
+        with lock_data(self.data_file):
+            self.sync()
+            count = self.move_to_archive(age_days)
+            if count:
+                self.save_snapshot()
+        return count
+
+    def rebuild_rollup(self):
+        with lock_data(self.data_file):
+            self.sync()
+            self.data["rollup"] = build_rollup(self.iter_tasks())
+            self.save_snapshot()
+
+    def get_settings(self):
+        return self.data.get("settings", {})
+
+    def get_sorted_ids(self):
+        return self.data.get("sorted_ids", {})
+
+    def count_tasks(self):
+        return len(self.tasks_by_id)
+
+    def has_archive(self):
+        return self.archive.has_tasks()
+
+    def get_task(self, global_id):
+        task = self.tasks_by_id.get(global_id)
+        if task is None and global_id is not None:
+            task = self.archive.find(global_id)
+        return task
+
+    def get_sessions(self, global_id):
+        task = self.get_task(global_id)
+        return task_sessions(task) if task else []
+
+    def iter_tasks(self, statuses=None):
+        if statuses is None:
+            self.drop_deleted()
+            yield from reversed(self.tasks)
+        else:
+            global_ids = set()
+            for status in statuses:
+                global_ids |= self.ids_by_status.get(status, set())
+            for global_id in sorted(global_ids, key=self.order.get, reverse=True):
+                yield self.tasks_by_id[global_id]
+        # Only closed tasks are archived, active listings never open a segment
+        if statuses is None or {"done", "dismissed"} & set(statuses):
+            for task in self.archive.iter_tasks(statuses):
+                if task["global_id"] not in self.tasks_by_id:
+                    yield task
+
+    def query_tasks(self, statuses, query):
+        # The indexes live in memory only, see TaskIndexes. A one-shot
+        # command scans, building them would cost more than the scan
+        if not query:
+            yield from self.iter_tasks(statuses)
+            return
+        if self.task_indexes is None and not self.long_lived:
+            yield from super().query_tasks(statuses, query)
+            return
+        # Indexes not built yet read the task list
+        self.drop_deleted()
+        if self.task_indexes is None:
+            self.task_indexes = TaskIndexes(self.tasks)
+        with span("query"):
+            status_ids = None
+            if statuses is not None:
+                status_ids = set()
+                for status in statuses:
+                    status_ids |= self.ids_by_status.get(status, set())
+            # The index giving the fewest candidates is read, the other
+            # filters are checked on them
+            name, size, fetch = self.task_indexes.plan(query, status_ids)[0]
+            count(f"query_index_{name}")
+            global_ids = sorted(fetch(), key=self.order.get, reverse=True)
+        for global_id in global_ids:
+            task = self.tasks_by_id[global_id]
+            if (statuses is None or task["status"] in statuses) and query.matches(task):
+                yield task
+        if statuses is None or {"done", "dismissed"} & set(statuses):
+            for task in self.archive.iter_tasks(statuses):
+                if task["global_id"] not in self.tasks_by_id and query.matches(task):
+                    yield task
+
+    def iter_sessions(self, first_date, last_date):
+        first, last = date_bounds(first_date, last_date)
+        # Tasks keep getting sessions after they are closed, segments are
+        # picked by the span of their sessions, not their month
+        archived = self.archive.iter_tasks(sessions_between=(first, last))
+        self.drop_deleted()
+        for task in itertools.chain(self.tasks, archived):
+            if task.get("sessions"):
+                for session in task_sessions(task):
+                    if first <= session.started < last:
+                        yield task, session
+
+    def stats_generation(self):
+        return self.data.get("stats_generation", 0)
+
+    def search_generation(self):
+        return self.data.get("search_generation", 0)
+
+    def store_id(self):
+        return self.data["store_id"]
+
+    def seconds_by_date(self, first_date, last_date):
+        days = self.data["rollup"]["days"]
+        months = self.data["rollup"]["months"]
+        seconds_by_date = {}
+        day = date.fromisoformat(first_date)
+        last_day = date.fromisoformat(last_date)
+        while day <= last_day:
+            day_string = day.strftime("%Y-%m-%d")
+            if day_string[:7] not in months:
+                # Nothing recorded this month, jump to the next one
+                day = (day.replace(day=1) + timedelta(days=32)).replace(day=1)
+                continue
+            if day_string in days:
+                seconds_by_date[day_string] = days[day_string]
+            day += timedelta(days=1)
+        return seconds_by_date
+
+    def add_task(self, task):
+        self.commit({"op": "add", "task": task})
+
+    def add_tasks(self, tasks):
+        with self.batch():
+            for task in tasks:
+                self.add_task(task)
+
+    def update_tasks(self, global_ids, fields):
+        with self.batch():
+            for global_id in global_ids:
+                self.update_task(global_id, fields)
+
+    def delete_tasks(self, global_ids):
+        with self.batch():
+            return [global_id for global_id in global_ids if self.delete_task(global_id)]
+
+    def update_task(self, global_id, fields):
+        self.restore_task(global_id)
+        self.commit({"op": "update", "global_id": global_id, "fields": fields})
+
+    def delete_task(self, global_id):
+        if not self.get_task(global_id):
+            return False
+        self.restore_task(global_id)
+        self.commit({"op": "delete", "global_id": global_id})
+        return True
+
+    def save_settings(self, settings):
+        self.commit({"op": "settings", "settings": settings})
+        # A changed data format is written out right away
+        if Settings.from_dict(settings).data_format != self.file_codec.name:
+            with lock_data(self.data_file):
+                self.sync()
+                self.save_snapshot()
+
+    def start_session(self, global_id, session):
+        self.restore_task(global_id)
+        self.commit({"op": "session_start", "global_id": global_id, "session": session})
+
+    def add_work(self, global_id, seconds, stopped):
+        task = self.get_task(global_id)
+        if not task or not task.get("sessions"):
+            return False
+        self.restore_task(global_id)
+        self.commit({"op": "work", "global_id": global_id,
+                     "seconds": seconds, "stopped": stopped})
+        return True
+
+
+class SqliteStore(Store):
+    """Tasks and sessions in SQLite tables indexed by global_id, status and
+    session date, so lookups and month queries don't read the whole store."""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS tasks (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            global_id TEXT NOT NULL UNIQUE,
+            status TEXT NOT NULL,
+            body TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status, seq);
+        CREATE INDEX IF NOT EXISTS tasks_project ON tasks (json_extract(body, '$.project'));
+        CREATE INDEX IF NOT EXISTS tasks_due ON tasks (json_extract(body, '$.date'));
+        CREATE INDEX IF NOT EXISTS tasks_added ON tasks (substr(json_extract(body, '$.date_added'), 1, 10));
+        CREATE INDEX IF NOT EXISTS tasks_done ON tasks (substr(json_extract(body, '$.date_done'), 1, 10));
+        CREATE INDEX IF NOT EXISTS tasks_value ON tasks (CAST(json_extract(body, '$.value') AS REAL));
+        CREATE TABLE IF NOT EXISTS sessions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            global_id TEXT NOT NULL,
+            date TEXT NOT NULL,
+            started INTEGER,
+            stopped INTEGER,
+            seconds INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE INDEX IF NOT EXISTS sessions_task ON sessions (global_id, id);
+        CREATE INDEX IF NOT EXISTS sessions_date ON sessions (date);
+        CREATE TABLE IF NOT EXISTS rollup (
+            date TEXT PRIMARY KEY,
+            seconds INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        );
+    """
+
+    # The indexed expressions of the TaskQuery ranges, written exactly as
+    # in SCHEMA so SQLite uses the indexes
+    RANGE_EXPRESSIONS = {
+        "date": "json_extract(body, '$.date')",
+        "date_added": "substr(json_extract(body, '$.date_added'), 1, 10)",
+        "date_done": "substr(json_extract(body, '$.date_done'), 1, 10)",
+        "value": "CAST(json_extract(body, '$.value') AS REAL)",
+    }
+
+    def __init__(self, sqlite_file):
+        import sqlite3  # Only loaded for migrated stores
+        self.sqlite_file = sqlite_file
+        # A running timer writes from its own threads
+        self.conn = sqlite3.connect(sqlite_file, check_same_thread=False)
+        self.conn.executescript(self.SCHEMA)
+        if not self.get_meta("store_id"):
+            with self.conn:
+                self.conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('store_id', ?)",
+                                  (json.dumps(uuid.uuid4().hex),))
+
+    def get_meta(self, key):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else {}
+
+    def set_meta(self, key, value):
+        self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                          (key, json.dumps(value)))
+
+    def get_settings(self):
+        return self.get_meta("settings")
+
+    def get_sorted_ids(self):
+        return self.get_meta("sorted_ids")
+
+    def count_tasks(self):
+        return self.conn.execute("SELECT COUNT(*) FROM tasks").fetchone()[0]
+
+    def get_task(self, global_id):
+        row = self.conn.execute("SELECT body FROM tasks WHERE global_id = ?", (global_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_sessions(self, global_id):
+        rows = self.conn.execute(
+            "SELECT started, stopped, seconds FROM sessions WHERE global_id = ? ORDER BY id",
+            (global_id,))
+        return [Session(*row) for row in rows]
+
+    def iter_tasks(self, statuses=None):
+        if statuses is None:
+            rows = self.conn.execute("SELECT body FROM tasks ORDER BY seq DESC")
+        else:
+            statuses = list(statuses)
+            placeholders = ", ".join("?" for _ in statuses)
+            rows = self.conn.execute(
+                f"SELECT body FROM tasks WHERE status IN ({placeholders}) ORDER BY seq DESC",
+                statuses)
+        for (body,) in rows:
+            yield json.loads(body)
+
+    def query_tasks(self, statuses, query):
+        # SQLite picks the index, the query is checked again on the rows
+        # for what SQL only narrows down: tags and values that aren't numbers
+        conditions, params = [], []
+        if statuses is not None:
+            statuses = list(statuses)
+            conditions.append(f"status IN ({', '.join('?' for _ in statuses)})")
+            params += statuses
+        if query.project is not None:
+            conditions.append("json_extract(body, '$.project') = ?")
+            params.append(query.project)
+        if query.tag is not None:
+            conditions.append("',' || json_extract(body, '$.tag') || ',' LIKE ?")
+            params.append(f"%,{query.tag},%")
+        for field, (first, last) in query.ranges.items():
+            if first is not None:
+                conditions.append(f"{self.RANGE_EXPRESSIONS[field]} >= ?")
+                params.append(first)
+            if last is not None:
+                conditions.append(f"{self.RANGE_EXPRESSIONS[field]} <= ?")
+                params.append(last)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        rows = self.conn.execute(f"SELECT body FROM tasks {where} ORDER BY seq DESC", params)
+        for (body,) in rows:
+            task = json.loads(body)
+            if query.matches(task):
+                yield task
+
+    def iter_sessions(self, first_date, last_date):
+        rows = self.conn.execute(
+            "SELECT global_id, started, stopped, seconds FROM sessions WHERE date BETWEEN ? AND ?",
+            (first_date, last_date))
+        tasks = {}
+        for global_id, started, stopped, seconds in rows:
+            if global_id not in tasks:
+                tasks[global_id] = self.get_task(global_id)
+            if tasks[global_id]:
+                yield tasks[global_id], Session(started, stopped, seconds)
+
+    def stats_generation(self):
+        return self.get_meta("stats_generation") or 0
+
+    def bump_stats_generation(self):
+        self.set_meta("stats_generation", self.stats_generation() + 1)
+
+    def search_generation(self):
+        return self.get_meta("search_generation") or 0
+
+    def store_id(self):
+        return self.get_meta("store_id")
+
+    def bump_search_generation(self):
+        self.set_meta("search_generation", self.search_generation() + 1)
+
+    def seconds_by_date(self, first_date, last_date):
+        rows = self.conn.execute(
+            "SELECT date, seconds FROM rollup WHERE date BETWEEN ? AND ?",
+            (first_date, last_date))
+        return dict(rows)
+
+    def add_to_rollup(self, date, seconds):
+        self.conn.execute(
+            "INSERT INTO rollup (date, seconds) VALUES (?, ?) "
+            "ON CONFLICT (date) DO UPDATE SET seconds = seconds + excluded.seconds",
+            (date, seconds))
+
+    def insert_session(self, global_id, session):
+        self.conn.execute(
+            "INSERT INTO sessions (global_id, date, started, stopped, seconds) VALUES (?, ?, ?, ?, ?)",
+            (global_id, session.date, session.started, session.stopped, session.seconds))
+
+    def insert_task(self, task):
+        with span("mutation"):
+            task = dict(task)
+            sessions = task_sessions(task)
+            del task["sessions"]
+            self.conn.execute("INSERT INTO tasks (global_id, status, body) VALUES (?, ?, ?)",
+                              (task["global_id"], task["status"], json.dumps(task)))
+            for session in sessions:
+                self.insert_session(task["global_id"], session)
+
+    def add_task(self, task):
+        self.add_tasks([task])
+
+    def add_tasks(self, tasks):
+        with self.conn:
+            for task in tasks:
+                self.insert_task(task)
+            if tasks:
+                self.bump_search_generation()
+            if any(task.get("sessions") for task in tasks):
+                self.bump_stats_generation()
+
+    def write_task(self, global_id, fields):
+        with span("mutation"):
+            task = self.get_task(global_id)
+            if not task:
+                return
+            task.update(fields)
+            self.conn.execute("UPDATE tasks SET status = ?, body = ? WHERE global_id = ?",
+                              (task["status"], json.dumps(task), global_id))
+            if STATS_FIELDS & fields.keys():
+                self.bump_stats_generation()
+            if SEARCH_FIELDS & fields.keys():
+                self.bump_search_generation()
+
+    def remove_task(self, global_id):
+        with span("mutation"):
+            cursor = self.conn.execute("DELETE FROM tasks WHERE global_id = ?", (global_id,))
+            rows = self.conn.execute(
+                "SELECT date, SUM(seconds) FROM sessions WHERE global_id = ? GROUP BY date",
+                (global_id,)).fetchall()
+            for day, seconds in rows:
+                self.add_to_rollup(day, -seconds)
+            self.conn.execute("DELETE FROM sessions WHERE global_id = ?", (global_id,))
+            if cursor.rowcount:
+                self.bump_stats_generation()
+                self.bump_search_generation()
+            return cursor.rowcount > 0
+
+    def update_task(self, global_id, fields):
+        with self.conn:
+            self.write_task(global_id, fields)
+
+    def update_tasks(self, global_ids, fields):
+        with self.conn:
+            for global_id in global_ids:
+                self.write_task(global_id, fields)
+
+    def delete_task(self, global_id):
+        with self.conn:
+            return self.remove_task(global_id)
+
+    def delete_tasks(self, global_ids):
+        with self.conn:
+            return [global_id for global_id in global_ids if self.remove_task(global_id)]
+
+    def save_settings(self, settings):
+        with self.conn:
+            self.set_meta("settings", settings)
+
+    def start_session(self, global_id, session):
+        with self.conn:
+            self.insert_session(global_id, session)
+            self.add_to_rollup(session.date, session.seconds)
+            self.bump_stats_generation()
+
+    def add_work(self, global_id, seconds, stopped):
+        task = self.get_task(global_id)
+        row = self.conn.execute(
+            "SELECT id, date FROM sessions WHERE global_id = ? ORDER BY id DESC LIMIT 1",
+            (global_id,)).fetchone()
+        if not task or row is None:
+            return False
+        task["work_seconds"] += seconds
+        with self.conn:
+            self.conn.execute("UPDATE tasks SET body = ? WHERE global_id = ?",
+                              (json.dumps(task), global_id))
+            self.conn.execute(
+                "UPDATE sessions SET stopped = ?, seconds = seconds + ? WHERE id = ?",
+                (stopped, seconds, row[0]))
+            self.add_to_rollup(row[1], seconds)
+            self.bump_stats_generation()
+        return True
+
+    def rebuild_rollup(self):
+        with self.conn:
+            self.conn.execute("DELETE FROM rollup")
+            self.conn.execute(
+                "INSERT INTO rollup (date, seconds) "
+                "SELECT date, SUM(seconds) FROM sessions GROUP BY date")
+
+    def import_data(self, data):
+        """Bulk loads a data.json document in one transaction."""
+        with self.conn:
+            for task in data.get("tasks", []):
+                self.insert_task(task)
+            self.set_meta("settings", data.get("settings", {}))
+            self.set_meta("sorted_ids", data.get("sorted_ids", {}))
+        self.rebuild_rollup()
+
+
+def open_store(files=None):
+    """Returns the SQLite store once the data has been migrated to it,
+    data.json otherwise."""
+    files = files or Files()
+    if os.path.exists(files.sqlite_file):
+        return SqliteStore(files.sqlite_file)
+    return JsonStore(files.data_file, files.archive_dir)
+
+
+def migrate_to_sqlite(files=None):
+    files = files or Files()
+    if os.path.exists(files.sqlite_file):
+        print(f"Data is already stored in {files.sqlite_file}")
+        return
+    json_store = JsonStore(files.data_file, files.archive_dir)
+    data = dict(json_store.data)
+    # Archived tasks are migrated too, oldest first
+    data["tasks"] = list(json_store.iter_tasks())[::-1]
+    tmp_file = files.sqlite_file + ".tmp"
+    if os.path.exists(tmp_file):
+        os.remove(tmp_file)
+    store = SqliteStore(tmp_file)
+    store.import_data(data)
+    store.conn.close()
+    # Only switch to the new store once the import is complete
+    os.replace(tmp_file, files.sqlite_file)
+    print(f"Imported {len(data.get('tasks', []))} tasks into {files.sqlite_file}. "
+          f"{files.data_file} is kept as a backup and no longer read.")
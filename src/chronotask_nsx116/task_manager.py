@@ -1,12 +1,20 @@
-from terminaltables import AsciiTable
 from datetime import date, datetime
 import os
-import textwrap
+import sys
+import threading
 import uuid
-from chronotask_nsx116.focustrack import FocusTrack 
 from chronotask_nsx116.settings import Settings, Files
-from chronotask_nsx116.writing_to_task import load_data, save_data, get_global_id_by_current_id
-from chronotask_nsx116.stats import make_minutes_by_date_plot
+from chronotask_nsx116.writing_to_task import get_global_id_by_current_id
+from chronotask_nsx116.writing_to_task import read_sorted_ids, write_sorted_ids
+from chronotask_nsx116.store import open_store
+from chronotask_nsx116.renderers import RENDERERS
+from chronotask_nsx116.profiling import span
+from chronotask_nsx116.aggregate import grouped_stats, print_grouped_stats
+from chronotask_nsx116.stats_cache import StatsCache
+from chronotask_nsx116.interchange import READERS, WRITERS, guess_format
+from chronotask_nsx116.search import SearchIndex
+from chronotask_nsx116.query import TaskQuery
+from chronotask_nsx116.writing_to_task import SEARCH_FIELDS
 
 class TaskManager:
     def __init__(self):
@@ -14,11 +22,25 @@ class TaskManager:
         self.data_dir = self.files.data_dir
         self.data_file = self.files.data_file
         os.makedirs(self.data_dir, exist_ok=True)
-        self.data = load_data(self.data_file)
-        self.sorted_ids = self.data.get("sorted_ids", {})
-        self.tasks = self.data.get("tasks", [])  # Dictionary to store tasks by their global ID
-        self.settings = Settings.from_dict(self.data.get("settings", {}))
-        self.timer = FocusTrack(self)
+        self.store = open_store(self.files)  # data.json or the migrated SQLite store
+        self.sorted_ids = self.load_sorted_ids()
+        self.settings = Settings.from_dict(self.store.get_settings())
+        self.timer = None  # FocusTrack, created by start_task only
+        self.daemon = False  # Set by the daemon, its timers don't wait for 'q'
+        self.write_lock = threading.RLock()  # Commands and the timer share the store
+        self.search_index = SearchIndex(self.files.search_index_file)  # Read by search only
+
+    # Reread what other processes wrote, the daemon does this before each command
+    def refresh(self):
+        self.store.refresh()
+        self.sorted_ids = self.load_sorted_ids()
+        self.settings = Settings.from_dict(self.store.get_settings())
+
+    # The IDs of the last list live in ids.json, stores written before that
+    # still hold them inside until the next list
+    def load_sorted_ids(self):
+        sorted_ids = read_sorted_ids(self.files.ids_file)
+        return self.store.get_sorted_ids() if sorted_ids is None else sorted_ids
 
     # Add a new task
     def add_task(self, text, due_date=None, project=None, tag=None, value=None):
@@ -35,100 +57,96 @@ class TaskManager:
         task["date_done"] = None
         task["date_dismissed"] = None
         task["status"] = "active"  # Can be "active", "done", or "dismissed"
-        task["total_work"] = 0
-        task["history"] = {}
-        self.data["tasks"].append(task)
-        save_data(self.data_file, self.data)
-
-    def mark_task_done(self, current_id):
-        task_id = get_global_id_by_current_id(current_id, self.sorted_ids)
-        task = None  # Initialize task as None
-        # Iterate through the list of tasks to find the one with the matching global_id
-        for item in self.tasks:
-            if task_id == item.get("global_id"):
-                task = item  # Found the task
-                break  # Exit loop once the task is found
-        if task:
-            task["status"] = "done"
-            task["date_done"] = datetime.today().strftime("%Y-%m-%d %H:%M:%S")
-            task["date_dismissed"] = None
-            save_data(self.data_file, self.data)  # Save changes to file
+        task["work_seconds"] = 0
+        task["sessions"] = []
+        before = self.store.search_generation()
+        self.store.add_task(task)
+        self.index_change(before, added=[task])
+
+    # Tells the search index what a change made since search generation
+    # before did to the searchable fields, the tasks removed as they were
+    # before it
+    def index_change(self, before, removed=(), added=()):
+        self.search_index.record(before, self.store.search_generation(), removed, added)
+
+    # Global IDs of the tasks a batch command acts on: the listed IDs, or
+    # every task matching the filters, or the listed IDs matching them
+    def select_tasks(self, current_ids, project=None, tag=None, statuses=None):
+        query = TaskQuery(project=project, tag=tag)
+        if not current_ids and not query and not statuses:
+            return []  # Nothing asked for, never every task
+        with span("lookup"):
+            if current_ids:
+                tasks = []
+                for current_id in current_ids:
+                    task_id = get_global_id_by_current_id(current_id, self.sorted_ids)
+                    task = self.store.get_task(task_id) if task_id else None
+                    if task:
+                        tasks.append(task)
+                    elif task_id:
+                        print(f"Task with ID {task_id} not found.")
+            else:
+                tasks = self.store.query_tasks(statuses or ["active"], query)
+            selected = []
+            for task in tasks:
+                if not query.matches(task):
+                    continue
+                if statuses and task["status"] not in statuses:
+                    continue
+                if task["global_id"] not in selected:
+                    selected.append(task["global_id"])
+            return selected
+
+    def set_status(self, task_ids, status):
+        now = datetime.today().strftime("%Y-%m-%d %H:%M:%S")
+        self.store.update_tasks(task_ids, {
+            "status": status,
+            "date_done": now if status == "done" else None,
+            "date_dismissed": now if status == "dismissed" else None,
+        })
+
+    def mark_tasks_done(self, task_ids):
+        self.set_status(task_ids, "done")
+        for task_id in task_ids:
             print(f"Task with ID {task_id} has been marked as done.")
-        else:
-            print(f"Task with ID {task_id} not found.")
-
-    def mark_task_active(self, current_id):
-        task_id = get_global_id_by_current_id(current_id, self.sorted_ids)
-        task = None  # Initialize task as None
-        # Iterate through the list of tasks to find the one with the matching global_id
-        for item in self.tasks:
-            if task_id == item.get("global_id"):
-                task = item  # Found the task
-                break  # Exit loop once the task is found
-        if task:
-            task["status"] = "active"
-            task["date_done"] = None
-            task["date_dismissed"] = None
-            save_data(self.data_file, self.data)  # Save changes to file
+
+    def mark_tasks_active(self, task_ids):
+        self.set_status(task_ids, "active")
+        for task_id in task_ids:
             print(f"Task with ID {task_id} has been marked as active.")
-        else:
-            print(f"Task with ID {task_id} not found.")
-
-    # Dismiss a task by task ID
-    def dismiss_task(self, current_id):
-        task_id = get_global_id_by_current_id(current_id, self.sorted_ids)
-        task = None  # Initialize task as None
-        # Iterate through the list of tasks to find the one with the matching global_id
-        for item in self.tasks:
-            if task_id == item.get("global_id"):
-                task = item  # Found the task
-                break  # Exit loop once the task is found
-        if task:
-            task["status"] = "dismissed"
-            task["date_dismissed"] = datetime.today().strftime("%Y-%m-%d %H:%M:%S")
-            task["date_done"] = None
-            save_data(self.data_file, self.data)  # Save changes to file
+
+    # Dismiss tasks by global ID
+    def dismiss_tasks(self, task_ids):
+        self.set_status(task_ids, "dismissed")
+        for task_id in task_ids:
             print(f"Task with ID {task_id} has been dismissed.")
-        else:
-            print(f"Task with ID {task_id} not found.")
-
-    # Delete a task by task ID
-    def delete_task(self, current_id):
-        task_id = get_global_id_by_current_id(current_id, self.sorted_ids)
-        task_found = False  # Track if the task was found and deleted
-        # Iterate over self.tasks to find and remove the task with the matching global_id
-        for i, item in enumerate(self.tasks):
-            if item.get("global_id") == task_id:
-                del self.tasks[i]  # Delete the task from the list
-                task_found = True
-                save_data(self.data_file, self.data)  # Save changes to file
-                print(f"Task with ID {task_id} has been deleted.")
-                break  # Exit loop after deleting the task
-        if not task_found:
-            print(f"Task with ID {task_id} not found.")
-
-    def modify_task(self, current_id, **kwargs):
-        task_id = get_global_id_by_current_id(current_id, self.sorted_ids)
-        task = None  # Initialize task as None
-        
-        # Iterate through the list of tasks to find the one with the matching global_id
-        for item in self.tasks:
-            if task_id == item.get("global_id"):
-                task = item  # Found the task
-                break  # Exit loop once the task is found
-        
-        if task:
-            # Update the task with provided keyword arguments
-            allowed_keys = {"text", "due_date", "project", "tag", "value"}
-            for key, value in kwargs.items():
-                if key in allowed_keys:
-                    task[key] = value  # Update the task's field
-            # print("Updated Task:", task)
-            
-            # Save updated tasks back to the data file
-            save_data(self.data_file, self.data)
-        else:
-            print(f"Task with ID {task_id} not found.")
+
+    # Delete tasks by global ID
+    def delete_tasks(self, task_ids):
+        before = self.store.search_generation()
+        tasks = {task_id: self.store.get_task(task_id) for task_id in task_ids}
+        deleted = self.store.delete_tasks(task_ids)
+        self.index_change(before, removed=[tasks[task_id] for task_id in deleted])
+        for task_id in deleted:
+            print(f"Task with ID {task_id} has been deleted.")
+
+    def modify_tasks(self, task_ids, **kwargs):
+        # Only the provided keyword arguments are changed, due_date is the
+        # task's "date" field. Returns False when none was provided
+        allowed_keys = {"text": "text", "due_date": "date", "project": "project",
+                        "tag": "tag", "value": "value"}
+        fields = {allowed_keys[key]: value for key, value in kwargs.items()
+                  if key in allowed_keys and value is not None}
+        if not fields:
+            return False
+        before = self.store.search_generation()
+        # Copies, the store may update its tasks in place
+        old_tasks = [dict(task) for task in map(self.store.get_task, task_ids) if task]
+        self.store.update_tasks(task_ids, fields)
+        if SEARCH_FIELDS & fields.keys():
+            self.index_change(before, removed=old_tasks,
+                              added=[self.store.get_task(task["global_id"]) for task in old_tasks])
+        return True
 
     def set_settings(self, **kwargs):
         # Convert the current settings to a dictionary
@@ -141,6 +159,10 @@ class TaskManager:
             "long_rest": "long_rest_duration",
             "pomodoros": "pomodoros_before_long_rest",
             "inactivity": "inactivity_limit",
+            "archive_after": "archive_after_days",
+            "activity_source": "activity_source",
+            "data_format": "data_format",
+            "notifications": "notifications",
         }
         
         # Update settings based on allowed keys
@@ -150,94 +172,176 @@ class TaskManager:
                         value * 60 if allowed_keys[key] in ["short_rest_duration", "long_rest_duration", "work_duration"] else value)  # Update the Settings instance attribute
         
         # Save updated settings back to the data file
-        self.data["settings"] = self.settings.to_dict()  # Update the settings in the data dictionary
-        save_data(self.data_file, self.data)  # Save the updated data
+        self.store.save_settings(self.settings.to_dict())
         print(
             f"Updated settings:\n"
             f"    Work: {int(self.settings.work_duration / 60)} minutes\n"
             f"    Short rest: {int(self.settings.short_rest_duration / 60)} minutes\n"
             f"    Long rest: {int(self.settings.long_rest_duration / 60)} minutes\n"
             f"    Pomodoros before long rest: {self.settings.pomodoros_before_long_rest}\n"
-            f"    Inactivity limit: {self.settings.inactivity_limit} seconds\n")
+            f"    Inactivity limit: {self.settings.inactivity_limit} seconds\n"
+            f"    Archive done tasks after: {self.settings.archive_after_days} days\n"
+            f"    Activity source: {self.settings.activity_source}\n"
+            f"    Data format: {self.settings.data_format}\n"
+            f"    Notifications: {self.settings.notifications}\n")
 
     def start_task(self, current_id):
-        self.timer.start(current_id)
+        # The timer stack pulls in pynput and pygame and opens the audio
+        # device, so it is only imported when a task is started
+        from chronotask_nsx116.focustrack import FocusTrack
+        if self.timer and not self.timer.stop_timer:
+            print("A timer is already running, stop it with 'chronotask stop'.")
+            return
+        self.timer = FocusTrack(self)
+        self.timer.start(current_id, wait_for_quit=not self.daemon)
         # print(current_id)
 
+    def stop_task(self):
+        # Only the daemon keeps a timer running between commands
+        if not self.timer or self.timer.stop_timer:
+            print("No timer is running.")
+            return
+        self.timer.stop()
+        print("Timer stopped.")
+
     # Printing tasks neatly 
-    def print_tasks(self):
-        table_data = [['ID', '[*]', 'Text', 'Created', 'Done', 'Hours']]
+    def print_tasks(self, output_format="table"):
+        renderer = RENDERERS[output_format]()
         for current_id, global_id in self.sorted_ids.items():
-            for item in self.tasks:
-                if global_id == item.get("global_id"):
-                    task = item
-                    break
-            if task["status"] == "active":
-                checkbox = "[ ]"
-            elif task["status"] == "done":
-                checkbox = "[x]"
-            elif task["status"] == "dismissed":
-                checkbox = "[-]"
-            else:
-                checkbox = "[?]"  # For any unknown status
-            wrapped_lines = textwrap.wrap(task["text"], width=35)
-            padded_lines = [line.ljust(35) for line in wrapped_lines]
-            task_text_wrapped = "\n".join(padded_lines)
-            datetime_string = task["date_added"]
-            date_added = datetime_string.split(" ")[0]
-            done_string = task.get("date_done")
-            date_done = done_string.split(" ")[0] if done_string else "    -     "
-            total_work_hours = round(task["total_work"] / 60, 1)
-            table_data.append([current_id, checkbox, task_text_wrapped, \
-                    date_added, date_done, total_work_hours])
-        table = AsciiTable(table_data)
-        print(table.table)
+            task = self.store.get_task(global_id)
+            if task:
+                with span("render"):
+                    renderer.add_row(current_id, task)
+        with span("render"):
+            renderer.finish()
 
     # List all tasks, with optional status filtering
-    def list_tasks(self, status):
-        # Reverse tasks order so items in table list from recents to olders
-        reversed_tasks = reversed(self.tasks) 
-        current_id = 1  # Initialize current_id sequence
+    def list_tasks(self, status, limit=None, offset=0, query=None, output_format="table"):
+        # Only the table gets the messages, tsv and jsonl output is for scripts
+        table = output_format == "table"
         self.sorted_ids = {} 
-        if not self.tasks:
-            print("No tasks available.")
+        if not self.store.count_tasks() and not self.store.has_archive():
+            if table:
+                print("No tasks available.")
             return
 
         if status and "all" in status:  # Adjust to check if 'all' is in the status list
-            print("All in status")
-            for item in reversed_tasks:
-                self.sorted_ids[current_id] = item["global_id"]
-                current_id += 1  # Increment current_id for the next task
-            if self.sorted_ids:
-                self.print_tasks()
-                self.data["sorted_ids"] = self.sorted_ids
-            save_data(self.data_file, self.data)
-
+            if table:
+                print("All in status")
+            statuses = None
         elif status:
-            print("done, dismissed, active in status")
-            for item in reversed_tasks:
-                if item["status"] in status:  # Check if the color is blue
-                    self.sorted_ids[current_id] = item["global_id"]
-                    current_id += 1  # Increment current_id for the next blue task
-            if self.sorted_ids:
-                self.print_tasks()
-            else:
+            if table:
+                print("done, dismissed, active in status")
+            statuses = status
+        else:
+            statuses = ["active"]
+
+        # Tasks come from recents to olders, tsv and jsonl rows are printed
+        # as they come, filters are looked up in the store's indexes
+        tasks = self.store.query_tasks(statuses, query or TaskQuery())
+        renderer = RENDERERS[output_format]()
+        current_id = 0
+        for task in tasks:
+            current_id += 1
+            # Skipped rows keep their IDs so they stay valid for 'id N' commands
+            self.sorted_ids[str(current_id)] = task["global_id"]
+            if current_id > offset:
+                with span("render"):
+                    renderer.add_row(current_id, task)
+            if limit and current_id >= offset + limit:
+                break
+        with span("render"):
+            renderer.finish()
+
+        if not renderer.count and table:
+            if query:
+                print("No tasks match the filters.")
+            elif status and "all" not in status:
                 print(f"No tasks with statuses: {', '.join(status)}")
-            self.data["sorted_ids"] = self.sorted_ids
-            save_data(self.data_file, self.data)
+            elif not status:
+                print("No tasks with status: active")
+        # Only the IDs file is written, listing never rewrites the store
+        write_sorted_ids(self.files.ids_file, self.sorted_ids)
 
-        else:
-            # print("Without status")
-            for item in reversed_tasks:
-                if item["status"] == "active":
-                    self.sorted_ids[current_id] = item["global_id"]
-                    current_id += 1  # Increment current_id for the next blue task
-            if self.sorted_ids:
-                self.print_tasks()
-            else:
-                    print("No tasks with status: active")
-            self.data["sorted_ids"] = self.sorted_ids
-            save_data(self.data_file, self.data)
+    # Rank the tasks by the words of their text, project and tag, the
+    # results get IDs for 'id N' commands like a list
+    def search_tasks(self, query, status=None, limit=20, output_format="table"):
+        table = output_format == "table"
+        statuses = None if not status or "all" in status else status
+        results = self.search_index.search(self.store, query, statuses, limit)
+        renderer = RENDERERS[output_format]()
+        self.sorted_ids = {}
+        for current_id, task in enumerate(results, 1):
+            self.sorted_ids[str(current_id)] = task["global_id"]
+            with span("render"):
+                renderer.add_row(current_id, task)
+        with span("render"):
+            renderer.finish()
+        if not results and table:
+            print(f"No tasks match '{query}'.")
+        write_sorted_ids(self.files.ids_file, self.sorted_ids)
+
+    # Move old done and dismissed tasks out of the hot store
+    def archive_tasks(self):
+        count = self.store.archive_tasks(self.settings.archive_after_days)
+        print(f"Archived {count} task(s) closed more than {self.settings.archive_after_days} days ago.")
+
+    # Stream every task, archived ones included, in the chosen format
+    def export_data(self, output=None, output_format="json"):
+        file = open(output, 'w', newline='') if output else sys.stdout
+        try:
+            writer = WRITERS[output_format](file, self.store.get_settings())
+            for task in self.store.iter_tasks():
+                if writer.with_sessions:
+                    task = dict(task, sessions=self.store.get_sessions(task["global_id"]))
+                writer.write(task)
+            writer.finish()
+        finally:
+            if output:
+                file.close()
+        if output:
+            print(f"Exported {writer.count} task(s) to {output}.")
+
+    # Read tasks from a TaskWarrior export or a CSV file, "-" is standard input
+    def import_tasks(self, path, input_format=None):
+        input_format = input_format or guess_format(path)
+        tasks = []
+        seen = set()
+        skipped = 0
+        try:
+            file = sys.stdin if path == "-" else open(path, newline='')
+            try:
+                for task in READERS[input_format](file):
+                    # Tasks already in the store or earlier in the file are skipped
+                    if task["global_id"] in seen or self.store.get_task(task["global_id"]):
+                        skipped += 1
+                        continue
+                    seen.add(task["global_id"])
+                    tasks.append(task)
+            finally:
+                if path != "-":
+                    file.close()
+        except OSError as e:
+            print(f"Could not read {path}: {e}")
+            return
+        except (ValueError, KeyError) as e:
+            print(f"Invalid {input_format} input, nothing imported: {e}")
+            return
+        # Oldest first, so the newest task is listed first as after add
+        tasks.sort(key=lambda task: task["date_added"])
+        before = self.store.search_generation()
+        self.store.add_tasks(tasks)
+        self.index_change(before, added=tasks)
+        print(f"Imported {len(tasks)} task(s), skipped {skipped} duplicate(s).")
 
     def stats(self, year, month):
-        make_minutes_by_date_plot(year, month, self.data)
+        with span("plot_import"):
+            from chronotask_nsx116.stats import make_minutes_by_date_plot  # plotext is only needed here
+        make_minutes_by_date_plot(year, month, self.store)
+
+    def grouped_stats(self, first_date, last_date, by):
+        # Unchanged breakdowns come from the cache, see StatsCache
+        cache = StatsCache(self.files.stats_cache_file)
+        stats = cache.get(self.store, f"{by}:{first_date}:{last_date}",
+                          lambda: grouped_stats(self.store, first_date, last_date, by))
+        print_grouped_stats(stats, first_date, last_date, by)
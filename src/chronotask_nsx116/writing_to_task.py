@@ -1,125 +1,375 @@
-from chronotask_nsx116.settings import Settings, Files
-from datetime import datetime
+import fcntl
+import gc
 import json
+import os
+import threading
+import time
 from pathlib import Path
 from collections import defaultdict
+from chronotask_nsx116.models import Session, decode_task, task_sessions
+from chronotask_nsx116.serializers import CODECS, detect_codec
+from chronotask_nsx116.profiling import count, span
+
+
+# Journal size in bytes after which it is folded into a new data.json snapshot
+JOURNAL_COMPACT_SIZE = 256 * 1024
+
+# Version of the data.json layout. 2: sessions as [started, stopped,
+# seconds] lists, work and the rollup in seconds
+DATA_FORMAT = 2
+
+# Task fields stats are grouped by, changing them changes past stats
+STATS_FIELDS = {"text", "project", "tag"}
+
+# Task fields the search index holds the words of
+SEARCH_FIELDS = {"text", "project", "tag"}
 
 
 def get_global_id_by_current_id(task_id, sorted_ids):
     task_id = str(task_id)
-    found = False                                   
-    for current_id, global_id in sorted_ids.items():
-        if task_id == current_id:
-            return global_id 
-    if not found:
-            print(f"No task with {task_id} found")
-    return None                                       
-
-
-def save_data(data_file, data):
-    with open(data_file, 'w') as file:
-        json.dump(data, file, indent=4)
-    
+    global_id = sorted_ids.get(task_id)
+    if global_id is None:
+        print(f"No task with {task_id} found")
+    return global_id
+
+
+def read_sorted_ids(ids_file):
+    """The current ID -> global ID mapping the last list printed, None if
+    no list has written it yet."""
+    try:
+        with open(ids_file) as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
+    except ValueError:
+        return {}  # Cut short by a crash, the next list writes it again
+
+
+def write_sorted_ids(ids_file, sorted_ids):
+    # Small enough to rewrite whole, data.json is not touched
+    tmp_file = ids_file + ".tmp"
+    with span("save_ids") as timing, open(tmp_file, 'w') as file:
+        timing.add_bytes(file.write(json.dumps(sorted_ids)))
+    os.replace(tmp_file, ids_file)
+
+
+def get_journal_file(data_file):
+    # data.json -> data.journal, kept next to the snapshot
+    return os.path.splitext(data_file)[0] + ".journal"
+
+
+def get_lock_file(data_file):
+    return os.path.splitext(data_file)[0] + ".lock"
+
+
+class DataLock:
+    """Exclusive flock on data.lock, held by processes while they read or
+    write the data files. Re-entrant within a process, so a compaction can
+    run inside a journal write."""
+
+    def __init__(self, lock_file):
+        self.lock_file = lock_file
+        self.thread_lock = threading.RLock()
+        self.file = None
+        self.depth = 0
+
+    def __enter__(self):
+        self.thread_lock.acquire()
+        if self.depth == 0:
+            self.file = open(self.lock_file, 'a')
+            fcntl.flock(self.file, fcntl.LOCK_EX)
+        self.depth += 1
+        return self
+
+    def __exit__(self, *exc_info):
+        self.depth -= 1
+        if self.depth == 0:
+            fcntl.flock(self.file, fcntl.LOCK_UN)
+            self.file.close()
+            self.file = None
+        self.thread_lock.release()
+
+
+data_locks = {}  # lock file -> DataLock shared by the stores of this process
+
+
+def lock_data(data_file):
+    lock_file = get_lock_file(data_file)
+    if lock_file not in data_locks:
+        data_locks[lock_file] = DataLock(lock_file)
+    return data_locks[lock_file]
+
+
+def journal_header(generation):
+    # First line of every journal: the snapshot generation it applies to
+    return (json.dumps({"op": "generation", "generation": generation}) + "\n").encode()
+
+
+def journal_state(data_file):
+    """Snapshot generation the journal applies to and its size in bytes.
+    Journals written before generations existed count as generation 0."""
+    try:
+        with open(get_journal_file(data_file), 'rb') as file:
+            first_line = file.readline()
+            size = os.fstat(file.fileno()).st_size
+    except FileNotFoundError:
+        return 0, 0
+    try:
+        record = json.loads(first_line)
+    except json.JSONDecodeError:
+        return 0, size
+    return record.get("generation", 0) if record.get("op") == "generation" else 0, size
+
+
+def reset_journal(data_file, generation):
+    """Replaces the journal by an empty one for the given snapshot
+    generation, returns its size."""
+    journal_file = get_journal_file(data_file)
+    header = journal_header(generation)
+    with open(journal_file + ".tmp", 'wb') as file:
+        file.write(header)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(journal_file + ".tmp", journal_file)
+    return len(header)
+
+
+def save_data(data_file, data, codec=CODECS["compact"]):
+    """Writes a full snapshot with codec and starts a new journal for it.
+    Must run under lock_data with data holding every journal record,
+    returns the size of the new journal.
+
+    Each snapshot gets the next generation number. A journal whose header
+    names an older generation was already folded into the snapshot (a
+    crash hit between the two renames) and is ignored. Both files are
+    written to a temporary file and renamed over the old one, so a crash
+    mid-write never leaves a truncated file."""
+    data["generation"] = data.get("generation", 0) + 1
+    tmp_file = data_file + ".tmp"
+    with span("save_data") as timing, open(tmp_file, 'wb') as file:
+        timing.add_bytes(file.write(codec.dumps(data)))
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_file, data_file)
+    return reset_journal(data_file, data["generation"])
+
 
 def load_data(data_file):
-    path = Path(data_file)
-    if path.exists():
-        contents = path.read_text()
-        data = json.loads(contents)
-        return data
+    """Returns the snapshot with the journal replayed on top, the journal
+    size covered (None if the journal belongs to another generation) and
+    the codec the snapshot was written with. The files are read under the
+    lock so they match, and parsed after it is released."""
+    with span("load_data") as timing:
+        data, offset, codec = read_data(data_file, timing)
+    return data, offset, codec
+
+
+def read_data(data_file, timing):
+    with lock_data(data_file):
+        path = Path(data_file)
+        contents = path.read_bytes() if path.exists() else None
+        journal_path = Path(get_journal_file(data_file))
+        journal = journal_path.read_bytes() if journal_path.exists() else b""
+    timing.add_bytes(len(contents or b"") + len(journal))
+    codec = CODECS["compact"]
+    if contents is not None:
+        codec = detect_codec(contents)
+        # The collector would walk the document again and again while it is
+        # being built, which takes longer than the parsing itself
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            data = codec.loads(contents)
+        finally:
+            if gc_enabled:
+                gc.enable()
+        # data.json of the first version has no format and no rollup,
+        # the store builds the rollup
+        data.setdefault("format", DATA_FORMAT)
+        for task in data.get("tasks", []):
+            decode_task(task)
     else:
-        return defaultdict(dict, {"settings": {},
+        data = defaultdict(dict, {"format": DATA_FORMAT,
+                                  "settings": {},
                                   "sorted_ids": {},
-                                  "tasks": []})
+                                  "tasks": [],
+                                  "rollup": {"days": {}, "months": {}}})
+    return data, replay_journal(data, journal), codec
+
+
+def add_to_rollup(rollup, date, seconds):
+    """Adds work seconds to the daily and monthly buckets stats reads from."""
+    rollup["days"][date] = rollup["days"].get(date, 0) + seconds
+    month = date[:7]
+    rollup["months"][month] = rollup["months"].get(month, 0) + seconds
+
+
+def build_rollup(tasks):
+    """Regenerates the seconds rollup from the raw task sessions."""
+    rollup = {"days": {}, "months": {}}
+    for task in tasks:
+        for session in task_sessions(task):
+            add_to_rollup(rollup, session.date, session.seconds)
+    return rollup
+
+
+def decode_record(record):
+    """Turns a journal record read from disk into the form apply_record
+    takes."""
+    if record.get("op") == "session_start":
+        record["session"] = Session(*record["session"])
+    return record
 
 
-def write_at_start(global_id, work_started_at):
-    files = Files()
-    data = load_data(files.data_file)
-    tasks = data.get("tasks", [])
+def bump_stats_generation(data):
+    data["stats_generation"] = data.get("stats_generation", 0) + 1
+
+
+def bump_search_generation(data):
+    data["search_generation"] = data.get("search_generation", 0) + 1
+
+
+def apply_record(data, record, tasks_by_id):
+    """Applies one journal record to the data in place. tasks_by_id maps
+    global_id to task and is kept up to date for added and deleted tasks.
+    A deleted task only leaves tasks_by_id, drop_deleted_tasks takes it out
+    of the task list so a run of deletes walks the list once."""
+    op = record.get("op")
+    tasks = data.setdefault("tasks", [])
+    task = tasks_by_id.get(record.get("global_id"))
+    # Snapshots written before the rollup existed get it rebuilt by the store
+    rollup = data.get("rollup")
+    if op == "add":
+        tasks.append(record["task"])
+        tasks_by_id[record["task"]["global_id"]] = record["task"]
+        # A task restored from the archive is searched and counted in stats
+        # as it was before
+        if not record.get("restored"):
+            bump_search_generation(data)
+            if record["task"].get("sessions"):
+                bump_stats_generation(data)
+    elif op == "update":
+        if task:
+            task.update(record["fields"])
+            if STATS_FIELDS & record["fields"].keys():
+                bump_stats_generation(data)
+            if SEARCH_FIELDS & record["fields"].keys():
+                bump_search_generation(data)
+    elif op == "delete":
+        if task:
+            bump_stats_generation(data)
+            bump_search_generation(data)
+            del tasks_by_id[record["global_id"]]
+            if rollup is not None:
+                for session in task_sessions(task):
+                    add_to_rollup(rollup, session.date, -session.seconds)
+    elif op == "session_start":
+        if task:
+            # A copy, the record may still wait in the batch while work is
+            # added to the session
+            session = Session(*record["session"].encode())
+            task_sessions(task).append(session)
+            bump_stats_generation(data)
+            if rollup is not None:
+                add_to_rollup(rollup, session.date, session.seconds)
+    elif op == "work":
+        if task and task.get("sessions"):
+            task["work_seconds"] += record["seconds"]
+            session = task_sessions(task)[-1]
+            session.stopped = record["stopped"]
+            session.seconds += record["seconds"]
+            bump_stats_generation(data)
+            if rollup is not None:
+                add_to_rollup(rollup, session.date, record["seconds"])
+    elif op == "settings":
+        data["settings"] = record["settings"]
+
+
+def drop_deleted_tasks(tasks, tasks_by_id):
+    # Tasks left in the list by deletes, tasks_by_id holds the live ones
+    tasks[:] = [task for task in tasks if tasks_by_id.get(task["global_id"]) is task]
+
+
+def replay_journal(data, journal):
+    """Applies the records of the journal contents to data. Returns the
+    journal size, or None without applying anything if its header names
+    another snapshot generation."""
+    tasks_by_id = {task["global_id"]: task for task in data.get("tasks", [])}
+    codec = CODECS["compact"]
+    for line in journal.splitlines():
+        try:
+            record = codec.loads(line)
+        except json.JSONDecodeError:
+            # Torn last line after a crash mid-append, nothing to replay
+            continue
+        if record.get("op") == "generation":
+            if record["generation"] != data.get("generation", 0):
+                return None
+            continue
+        apply_record(data, decode_record(record), tasks_by_id)
+    if len(tasks_by_id) < len(data.get("tasks", [])):
+        drop_deleted_tasks(data["tasks"], tasks_by_id)
+    return len(journal)
+
+
+def write_to_journal(data_file, records, generation, durable=False):
+    """Appends mutation records to the journal instead of rewriting the
+    whole data file, starting it with a header when it is new. Must run
+    under lock_data, returns the journal size. durable syncs the records
+    to disk before returning."""
+    journal_file = get_journal_file(data_file)
+    with span("journal_write") as timing, open(journal_file, 'ab') as file:
+        if file.tell() == 0:
+            file.write(journal_header(generation))
+        codec = CODECS["compact"]
+        timing.add_bytes(file.write(b"".join(codec.dumps(record) + b"\n" for record in records)))
+        if durable:
+            file.flush()
+            os.fsync(file.fileno())
+        return file.tell()
+
+
+def write_at_start(store, global_id, work_started_at):
     # Get the task's global ID
     task_id = global_id
-    if not tasks:
+    if not store.count_tasks():
         print("No tasks available.")
         return
     # Locate the task by its global ID
-    task = next((item for item in tasks if item.get("global_id") == task_id), None)
-    if not task:
+    if not store.get_task(task_id):
         print(f"Task with start ID {task_id} not found.")
         return
-    # Get today's date as a string
-    today = datetime.now().strftime("%Y-%m-%d")
-    # Initialize history for today if it doesn't exist
-    if "history" not in task:
-        task["history"] = {}
-    if today not in task["history"]:
-        task["history"][today] = []
-    # Add the new work session to the task's history
-    task["history"][today].append({
-        "work_started_at": work_started_at, 
-        "work_stopped_at": None, 
-        "minutes": 0,
-    })
-    # Save the updated data back to the file
-    save_data(files.data_file, data)
-
-
-def write_total_activity_to_task(data_file, global_id, settings):
-    data = load_data(data_file)
-    tasks = data.get("tasks")  
+    # Add the new work session, started at work_started_at epoch seconds
+    store.start_session(task_id, Session(work_started_at))
+    count("session_writes")
+
+
+def write_total_activity_to_task(store, global_id, activity_seconds, now=None):
+    # now is the epoch time the session stopped at, the current time by default
     task_id = str(global_id)
-    if tasks:
-        for item in tasks:
-            if task_id == item.get("global_id"):
-                task = item
-                break
-        if task:
-            task["total_work"] += round(settings.work_duration / 60, 1)
-            try:
-                last_date = max(task["history"].keys())
-                last_item = task["history"][last_date][-1]
-                now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                last_item["work_stopped_at"] = now
-                last_item["minutes"] += round(settings.work_duration / 60, 1)
-            except KeyError:
+    if store.count_tasks():
+        if store.get_task(task_id):
+            if not store.add_work(task_id, round(activity_seconds), int(time.time() if now is None else now)):
                 print(f"No history available for task with ID {task_id}.")
+            count("session_writes")
         else:
             print(f"Task with ID {task_id} not found.")
-    save_data(data_file, data)
 
 
-def write_past_minutes_when_quit(global_id, activity_duration):
-    files = Files()
-    data = load_data(files.data_file)
-    tasks = data.get("tasks", [])
-    
+def write_past_minutes_when_quit(store, global_id, activity_seconds, now=None):
     # Get the task's global ID
     task_id = global_id
     
-    if not tasks:
+    if not store.count_tasks():
         print("No tasks available.")
         return
     
     # Locate the task by its global ID
-    task = next((item for item in tasks if item.get("global_id") == task_id), None)
-    
-    if not task:
+    if not store.get_task(task_id):
         print(f"Task with ID {task_id} not found.")
         return
     
-    # Get today's date as a string
-    today = datetime.now().strftime("%Y-%m-%d")
-    if task:
-        task["total_work"] += round(activity_duration / 60, 1)
-        try:
-            last_date = max(task["history"].keys())
-            last_item = task["history"][last_date][-1]
-            now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            last_item["work_stopped_at"] = now
-            last_item["minutes"] += round(activity_duration / 60, 1)
-        except KeyError:
-            print(f"No history available for task with ID {task_id}.")
-    else:
-        print(f"Task with ID {task_id} not found.")
-    save_data(files.data_file, data)
+    if not store.add_work(task_id, round(activity_seconds), int(time.time() if now is None else now)):
+        print(f"No history available for task with ID {task_id}.")
+    count("session_writes")
     # print(f"Updated task {task_id} with work session on {today}.")
@@ -0,0 +1,47 @@
+import time
+
+from chronotask_nsx116.aggregate import grouped_stats
+from chronotask_nsx116.interchange import new_task
+from chronotask_nsx116.models import Session
+from chronotask_nsx116.store import JsonStore
+
+HOUR = 3600
+
+
+def local_epoch(timestamp):
+    return int(time.mktime(time.strptime(timestamp, "%Y-%m-%d %H:%M:%S")))
+
+
+def store_with_sessions(tmp_path, *sessions):
+    store = JsonStore(str(tmp_path / "data.json"), str(tmp_path / "archive"))
+    task = new_task(text="Long work")
+    store.add_task(task)
+    for started, stopped, seconds in sessions:
+        store.start_session(task["global_id"], Session(started))
+        store.add_work(task["global_id"], seconds, stopped)
+    return store
+
+
+def rows(store, by):
+    stats = grouped_stats(store, "2024-03-01", "2024-03-31", by)
+    return {label: (seconds, count) for label, seconds, count in stats["rows"]}, stats
+
+
+def test_a_long_session_is_split_over_its_hours(tmp_path):
+    started = local_epoch("2024-03-13 11:00:00")  # A Wednesday
+    store = store_with_sessions(tmp_path, (started, started + 8 * HOUR, 8 * HOUR))
+    by_hour, stats = rows(store, "hour")
+    assert by_hour == {f"{hour:02d}:00": (HOUR, 1) for hour in range(11, 19)}
+    assert stats["seconds"] == 8 * HOUR and stats["sessions"] == 1
+
+
+def test_a_session_across_midnight_is_split_over_both_days(tmp_path):
+    started = local_epoch("2024-03-13 22:30:00")
+    # Two hours of work over three hours, the shares follow the time spent
+    store = store_with_sessions(tmp_path, (started, started + 3 * HOUR, 2 * HOUR))
+    by_weekday, stats = rows(store, "weekday")
+    assert by_weekday == {"Wednesday": (HOUR, 1), "Thursday": (HOUR, 1)}
+    by_hour, _ = rows(store, "hour")
+    assert by_hour == {"22:00": (HOUR // 3, 1), "23:00": (2 * HOUR // 3, 1),
+                       "00:00": (2 * HOUR // 3, 1), "01:00": (HOUR // 3, 1)}
+    assert sum(seconds for seconds, _ in by_hour.values()) == stats["seconds"] == 2 * HOUR
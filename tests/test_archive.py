@@ -0,0 +1,31 @@
+from chronotask_nsx116.archive import Archive
+from chronotask_nsx116.models import Session
+from chronotask_nsx116.store import date_bounds
+
+
+def done_task(global_id, date_done, *starts):
+    return {"global_id": global_id, "status": "done", "date_done": date_done,
+            "sessions": [Session(started, started + 60, 60) for started in starts]}
+
+
+def test_segments_are_picked_by_session_span_not_closing_month(tmp_path):
+    archive = Archive(str(tmp_path / "archive"))
+    january, _ = date_bounds("2024-01-10", "2024-01-10")
+    march, _ = date_bounds("2024-03-05", "2024-03-05")
+    # Closed in January, worked on again in March
+    archive.add([done_task("a", "2024-01-10 12:00:00", january, march)])
+    archive.add([done_task("b", "2024-02-01 12:00:00", january)])
+
+    march_range = date_bounds("2024-03-01", "2024-03-31")
+    assert [task["global_id"] for task in Archive(archive.archive_dir).iter_tasks(sessions_between=march_range)] == ["a"]
+    april_range = date_bounds("2024-04-01", "2024-04-30")
+    assert list(Archive(archive.archive_dir).iter_tasks(sessions_between=april_range)) == []
+
+
+def test_segments_without_a_span_are_read(tmp_path):
+    archive = Archive(str(tmp_path / "archive"))
+    january, _ = date_bounds("2024-01-10", "2024-01-10")
+    archive.add([done_task("a", "2024-01-10 12:00:00", january)])
+    (tmp_path / "archive" / "spans.idx").unlink()
+    april_range = date_bounds("2024-04-01", "2024-04-30")
+    assert [task["global_id"] for task in Archive(archive.archive_dir).iter_tasks(sessions_between=april_range)] == ["a"]
@@ -0,0 +1,40 @@
+from chronotask_nsx116.arguments import parse_args, run_command
+from chronotask_nsx116.task_manager import TaskManager
+
+
+def make_manager(tmp_path, monkeypatch):
+    # appdirs puts the data directory under XDG_DATA_HOME
+    monkeypatch.setenv("XDG_DATA_HOME", str(tmp_path))
+    manager = TaskManager()
+    for text in ("First", "Second", "Third"):
+        manager.add_task(text)
+    return manager
+
+
+def task_states(manager):
+    return [(task["global_id"], task["status"]) for task in manager.store.iter_tasks()]
+
+
+def test_id_delete_without_ids_or_filters_changes_nothing(tmp_path, monkeypatch, capsys):
+    manager = make_manager(tmp_path, monkeypatch)
+    before = task_states(manager)
+    for action in ("delete", "done", "dismiss"):
+        run_command(manager, parse_args(["id", action]))
+    assert task_states(TaskManager()) == before
+    assert "Give task IDs" in capsys.readouterr().out
+
+
+def test_id_delete_with_a_filter_still_works(tmp_path, monkeypatch):
+    manager = make_manager(tmp_path, monkeypatch)
+    run_command(manager, parse_args(["id", "--status", "active", "delete"]))
+    assert task_states(TaskManager()) == []
+
+
+def test_id_mod_without_fields_reports_nothing_changed(tmp_path, monkeypatch, capsys):
+    manager = make_manager(tmp_path, monkeypatch)
+    manager.list_tasks(None)
+    capsys.readouterr()
+    run_command(manager, parse_args(["id", "1", "mod"]))
+    output = capsys.readouterr().out
+    assert "Modified" not in output
+    assert "Nothing to change" in output
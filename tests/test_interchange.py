@@ -0,0 +1,23 @@
+import io
+import json
+
+from chronotask_nsx116.interchange import TaskwarriorWriter, new_task, read_csv
+
+
+def test_taskwarrior_priority_from_a_cli_value():
+    output = io.StringIO()
+    writer = TaskwarriorWriter(output, {})
+    writer.write(new_task(text="From the CLI", value="3"))
+    writer.write(new_task(text="Not a level", value="high"))
+    writer.finish()
+    records = json.loads(output.getvalue())
+    assert records[0]["priority"] == "H"
+    assert "priority" not in records[1]
+
+
+def test_read_csv_keeps_other_values_and_skips_bad_work_seconds(capsys):
+    rows = io.StringIO("text,value,work_seconds\nwhole,2,60\nhalf,2.5,\nword,high,\nbroken,1,soon\n")
+    tasks = list(read_csv(rows))
+    assert [(task["text"], task["value"]) for task in tasks] == [("whole", 2), ("half", "2.5"), ("word", "high")]
+    assert tasks[0]["work_seconds"] == 60
+    assert "Skipped line 5" in capsys.readouterr().out
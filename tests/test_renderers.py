@@ -0,0 +1,25 @@
+from chronotask_nsx116.renderers import TableRenderer
+
+
+def make_task(work_seconds):
+    return {"text": "Task", "status": "active", "date_added": "2024-03-13 08:00:00",
+            "work_seconds": work_seconds}
+
+
+def test_id_and_hours_columns_fit_the_widest_value(capsys):
+    renderer = TableRenderer()
+    renderer.add_row(9, make_task(0))
+    renderer.add_row(10, make_task(12345 * 3600))
+    renderer.finish()
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[1].startswith("| ID | [*] |")
+    assert lines[1].endswith("| Hours   |")
+    assert lines[3].startswith("| 9  |")
+    assert lines[4].endswith("| 12345.0 |")
+    assert len({len(line) for line in lines}) == 1
+
+
+def test_nothing_printed_without_rows(capsys):
+    renderer = TableRenderer()
+    renderer.finish()
+    assert capsys.readouterr().out == ""
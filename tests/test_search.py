@@ -0,0 +1,36 @@
+from chronotask_nsx116.search import SearchIndex
+from chronotask_nsx116.store import migrate_to_sqlite
+from chronotask_nsx116.task_manager import TaskManager
+
+
+def search_texts(manager, query):
+    return [task["text"] for task in manager.search_index.search(manager.store, query)]
+
+
+def test_tasks_added_after_migrate_are_found(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_DATA_HOME", str(tmp_path))
+    manager = TaskManager()
+    for text in ("Write report", "Read paper", "Plan trip"):
+        manager.add_task(text)
+    assert search_texts(manager, "report") == ["Write report"]
+    migrate_to_sqlite(manager.files)
+    manager = TaskManager()
+    # As many changes as data.json had seen, the generations meet again
+    for text in ("Feed zebra", "Wash car", "Call home"):
+        manager.add_task(text)
+    assert search_texts(TaskManager(), "zebra") == ["Feed zebra"]
+
+
+def test_restoring_an_archived_task_keeps_the_index(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_DATA_HOME", str(tmp_path))
+    manager = TaskManager()
+    manager.add_task("Old chore")
+    global_id = next(manager.store.iter_tasks())["global_id"]
+    manager.store.update_task(global_id, {"status": "done", "date_done": "2020-01-15 10:00:00"})
+    manager.store.archive_tasks(30)
+    assert search_texts(manager, "chore") == ["Old chore"]
+    manager.mark_tasks_active([global_id])
+    builds = []
+    monkeypatch.setattr(SearchIndex, "build", lambda index, store: builds.append(store))
+    assert search_texts(TaskManager(), "chore") == ["Old chore"]
+    assert builds == []
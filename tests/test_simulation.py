@@ -0,0 +1,91 @@
+import contextlib
+import io
+import json
+
+from chronotask_nsx116.activity import ScriptedSource
+from chronotask_nsx116.clock import SimulatedClock
+from chronotask_nsx116.focustrack import FocusTrack
+from chronotask_nsx116.interchange import new_task
+from chronotask_nsx116.models import task_sessions
+from chronotask_nsx116.settings import Settings
+from chronotask_nsx116.simulation import SimulationHost, simulate_days, workday_timeline
+from chronotask_nsx116.store import JsonStore
+from chronotask_nsx116.writing_to_task import get_journal_file
+
+EPOCH = 1710316800  # 2024-03-13 08:00 UTC
+SETTINGS = Settings(work_duration=1500, short_rest_duration=300, long_rest_duration=900,
+                    pomodoros_before_long_rest=4, inactivity_limit=90, notifications="none")
+# Activity every 30 seconds for two hours, none for ten minutes after the
+# first hour. The session lasts until 7260, the inactivity limit after the
+# last event at 7170
+TIMELINE = workday_timeline(hours=2, every=30, lunch_at=1, lunch_minutes=10)
+
+
+def simulate(tmp_path, days):
+    store = JsonStore(str(tmp_path / "data.json"), str(tmp_path / "archive"))
+    task = new_task(text="Simulated task")
+    store.add_task(task)
+    sessions = simulate_days(store, task["global_id"], days, TIMELINE, SETTINGS, EPOCH)
+    # Read back from disk, the way the next command would see it
+    return sessions, JsonStore(str(tmp_path / "data.json"), str(tmp_path / "archive")), task["global_id"]
+
+
+def test_work_rest_and_idle_seconds_of_a_session(tmp_path):
+    [session], _, _ = simulate(tmp_path, 1)
+    # Pomodoros from 0, 1830 (rest ended at 1800, activity at 1830) and
+    # 4200 (after the break in activity), rests of 300 after each, and
+    # work from 6030 until the stop at 7260
+    assert session["pomodoros"] == 3
+    assert session["work_seconds"] == 3 * 1500 + 1230
+    assert session["rest_seconds"] == 3 * 300
+    assert session["idle_seconds"] == 30 + 570 + 30
+    assert session["activity_events"] == len(TIMELINE)
+
+
+def test_checkpoints_and_totals_written_to_the_store(tmp_path):
+    _, store, global_id = simulate(tmp_path, 1)
+    with open(get_journal_file(store.data_file)) as file:
+        records = [json.loads(line) for line in file]
+    work = [(record["seconds"], record["stopped"] - EPOCH) for record in records if record["op"] == "work"]
+    # A write every 300 seconds of work, the last pomodoro's at the stop
+    expected = [(300, end) for start in (0, 1830, 4200) for end in range(start + 300, start + 1501, 300)]
+    expected += [(300, end) for end in (6330, 6630, 6930, 7230)] + [(30, 7260)]
+    assert work == expected
+    task = store.get_task(global_id)
+    assert [session.seconds for session in task_sessions(task)] == [5730]
+    assert task["work_seconds"] == 5730
+    assert sum(store.data["rollup"]["days"].values()) == 5730
+
+
+def test_every_day_adds_the_same_session(tmp_path):
+    sessions, store, global_id = simulate(tmp_path, 3)
+    assert [session["expected_seconds"] for session in sessions] == [5730] * 3
+    assert [session.seconds for session in task_sessions(store.get_task(global_id))] == [5730] * 3
+    assert sorted(store.data["rollup"]["days"].values()) == [5730] * 3
+
+
+def test_events_taken_before_stop_write_nothing(tmp_path):
+    store = JsonStore(str(tmp_path / "data.json"), str(tmp_path / "archive"))
+    task = new_task(text="Simulated task")
+    store.add_task(task)
+    clock = SimulatedClock(EPOCH)
+    timer = FocusTrack(SimulationHost(store, SETTINGS), activity_source=ScriptedSource(TIMELINE, clock.monotonic),
+                       clock=clock)
+    with contextlib.redirect_stdout(io.StringIO()):
+        timer.begin(task["global_id"])
+        timer.interval_timer.run(task["global_id"], until=1499)
+        # The end of the pomodoro is due, its events are taken off the
+        # scheduler but stop comes before they run
+        clock.elapsed = 1500
+        taken = []
+        while True:
+            callback, _ = timer.scheduler.pop_due()
+            if not callback:
+                break
+            taken.append(callback)
+        timer.stop()
+        for callback in taken:
+            callback()
+    with open(get_journal_file(store.data_file)) as file:
+        work = [record["seconds"] for record in map(json.loads, file) if record["op"] == "work"]
+    assert sum(work) == 1500
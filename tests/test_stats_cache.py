@@ -0,0 +1,34 @@
+import os
+
+from chronotask_nsx116.interchange import new_task
+from chronotask_nsx116.models import Session
+from chronotask_nsx116.stats_cache import StatsCache
+from chronotask_nsx116.store import JsonStore, SqliteStore
+
+
+def cached_count(cache, store):
+    return cache.get(store, "sessions", lambda: sum(1 for _ in store.iter_sessions("2024-01-01", "2024-01-31")))
+
+
+def test_hits_dont_write_and_sessions_invalidate(tmp_path):
+    store = JsonStore(str(tmp_path / "data.json"), str(tmp_path / "archive"))
+    task = new_task(text="Task")
+    store.add_task(task)
+    cache_file = str(tmp_path / "stats_cache.json")
+    assert cached_count(StatsCache(cache_file), store) == 0
+    written = os.stat(cache_file).st_mtime_ns
+    os.utime(cache_file, ns=(0, 0))
+    assert cached_count(StatsCache(cache_file), store) == 0
+    assert os.stat(cache_file).st_mtime_ns == 0 != written
+    # A session without work yet leaves the rollup as it was
+    store.start_session(task["global_id"], Session(1705312800))  # 2024-01-15
+    assert cached_count(StatsCache(cache_file), store) == 1
+
+
+def test_another_store_with_the_same_generation_misses(tmp_path):
+    cache_file = str(tmp_path / "stats_cache.json")
+    json_store = JsonStore(str(tmp_path / "data.json"), str(tmp_path / "archive"))
+    assert StatsCache(cache_file).get(json_store, "key", lambda: "json") == "json"
+    sqlite_store = SqliteStore(str(tmp_path / "data.sqlite3"))
+    assert sqlite_store.stats_generation() == json_store.stats_generation()
+    assert StatsCache(cache_file).get(sqlite_store, "key", lambda: "sqlite") == "sqlite"
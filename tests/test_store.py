@@ -0,0 +1,61 @@
+from chronotask_nsx116.interchange import new_task
+from chronotask_nsx116.query import TaskQuery
+from chronotask_nsx116.store import JsonStore
+
+
+def open_store(tmp_path):
+    return JsonStore(str(tmp_path / "data.json"), str(tmp_path / "archive"))
+
+
+def test_deleted_tasks_leave_the_list_and_the_journal_replay(tmp_path):
+    store = open_store(tmp_path)
+    tasks = [new_task(text=f"Task {i}") for i in range(10)]
+    store.add_tasks(tasks)
+    store.delete_tasks([task["global_id"] for task in tasks[2:8]])
+    kept = [tasks[9], tasks[8], tasks[1], tasks[0]]
+    assert [task["global_id"] for task in store.iter_tasks()] == [task["global_id"] for task in kept]
+    assert store.count_tasks() == 4
+    reloaded = open_store(tmp_path)
+    assert [task["global_id"] for task in reloaded.iter_tasks()] == [task["global_id"] for task in kept]
+    assert len(reloaded.tasks) == 4
+
+
+def archived_store(tmp_path):
+    store = open_store(tmp_path)
+    task = new_task(text="Old", status="done", date_done="2020-01-15 10:00:00")
+    store.add_task(task)
+    store.archive_tasks(30)
+    return store, task["global_id"]
+
+
+def test_restored_task_is_in_the_journal_before_it_leaves_the_archive(tmp_path):
+    store, global_id = archived_store(tmp_path)
+    with store.batch():
+        store.update_task(global_id, {"text": "Restored"})
+        # The batch isn't flushed, a crash here must not lose the task
+        crashed = open_store(tmp_path)
+        assert crashed.get_task(global_id)["text"] == "Old"
+        assert global_id in crashed.tasks_by_id
+    assert open_store(tmp_path).get_task(global_id)["text"] == "Restored"
+
+
+def test_archive_changes_of_another_process_are_seen(tmp_path):
+    store, global_id = archived_store(tmp_path)
+    assert store.get_task(global_id)
+    other = open_store(tmp_path)
+    other.delete_task(global_id)
+    store.refresh()
+    assert store.get_task(global_id) is None
+
+
+def test_filters_scan_in_one_shot_stores_and_use_indexes_in_long_lived_ones(tmp_path):
+    store = open_store(tmp_path)
+    store.add_tasks([new_task(text=f"Task {i}", project="work" if i % 3 else "home", value=i % 4)
+                     for i in range(30)])
+    query = TaskQuery(project="work", min_value=2)
+    scanned = [task["global_id"] for task in store.query_tasks(None, query)]
+    assert store.task_indexes is None
+    store.long_lived = True
+    assert [task["global_id"] for task in store.query_tasks(None, query)] == scanned
+    assert store.task_indexes is not None
+    assert len(scanned) == sum(1 for i in range(30) if i % 3 and i % 4 >= 2)